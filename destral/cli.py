@@ -2,16 +2,24 @@ import os
 import sys
 import subprocess
 import logging
-import requests
+import time
 
 import click
 from destral.utils import *
 from destral.testing import run_unittest_suite, get_unittest_suite
+from destral.testing import shard_suite, select_suite
 from destral.testing import run_spec_suite, get_spec_suite
-from destral.linter import run_linter
-from destral.openerp import OpenERPService
+from destral.linter import run_linter, start_linter
+from destral.openerp import OpenERPService, DatabaseTeardownQueue
+from destral.openerp import cleanup_orphan_databases
 from destral.patch import RestorePatchedRegisterAll
-from destral.cover import OOCoverage
+from destral.cover import OOCoverage, use_fast_core, run_data_suffix
+from destral.scheduler import run_in_pool, parse_shard, split_modules
+from destral.history import TimingHistory, load_durations
+from destral.impact import ImpactMap
+from destral.pipeline import DatabasePipeline
+from destral.pgcluster import EphemeralCluster
+from destral.forkserver import ForkServer
 
 LOG_FORMAT = '%(asctime)s:{0}'.format(logging.BASIC_FORMAT)
 
@@ -20,6 +28,258 @@ logging.basicConfig(level=logging.DEBUG, format=LOG_FORMAT)
 logger = logging.getLogger('destral.cli')
 
 
+def run_module_tests(module, service, coverage, tests=None, all_tests=False,
+                     dropdb=True, report_junitxml=False, test_shard=None,
+                     test_durations=None, impact_map=False,
+                     prepared_database=None, prepared_demo=False,
+                     database_dropper=None):
+    """Run the spec and unit suites of a module.
+
+    :param module: Module to test
+    :param service: OpenERPService used by the run
+    :param coverage: OOCoverage measuring the suites
+    :param test_shard: Tuple with the partition of the unit tests to run and
+        the number of partitions. The specs only run in the first one.
+    :param test_durations: Dictionary with the durations of the tests by id
+        to partition them by duration
+    :param impact_map: Only run the unit tests impacted by the changes
+        according to the ImpactMap of the module, and record the map when
+        the whole suite runs
+    :param prepared_database: Database with the module already installed
+    :param prepared_demo: Has the prepared database demo data?
+    :param database_dropper: Callable dropping the database of the module
+        instead of dropping it synchronously
+    :return: a tuple with the list of results, the JUnitXML suites and the
+        timings of the module
+    """
+    start = time.time()
+    timings = {}
+    results = []
+    junitxml_suites = []
+    addons_path = service.config['addons_path']
+    with RestorePatchedRegisterAll():
+        spec_suite = (
+            (not test_shard or test_shard[0] == 1) and
+            get_spec_suite(os.path.join(addons_path, module))
+        )
+        if spec_suite:
+            logger.info('Spec testing module %s', module)
+            coverage.start()
+            spec_start = time.time()
+            report = run_spec_suite(spec_suite)
+            timings['spec'] = time.time() - spec_start
+            coverage.stop()
+            results.append(not len(report.failed_examples) > 0)
+            if report_junitxml:
+                junitxml_suites += report.create_report_suites()
+        logger.info('Unit testing module %s', module)
+        os.environ['DESTRAL_MODULE'] = module
+        coverage.start()
+        try:
+            suite = get_unittest_suite(module, tests)
+        except Exception as e:
+            logger.error('Suite not found: {}'.format(e))
+            service.shutdown(1)
+            raise
+        if all_tests:
+            for m in get_dependencies(module, addons_path):
+                for test in get_unittest_suite(m):
+                    if test not in suite:
+                        suite.addTest(test)
+        if test_shard:
+            suite = shard_suite(
+                suite, test_shard[0], test_shard[1], test_durations
+            )
+        impact = None
+        partial = bool(test_shard)
+        if impact_map and coverage.enabled:
+            impact = ImpactMap(module)
+            module_path = os.path.join(addons_path, module)
+            commit = ImpactMap.clean_commit(module_path)
+            if not (tests or all_tests or test_shard):
+                selected = impact.select_tests(module_path)
+                if selected is not None:
+                    suite = select_suite(suite, selected)
+                    partial = True
+        suite.drop_database = dropdb
+        suite.prepared_database = prepared_database
+        suite.prepared_demo = prepared_demo
+        suite.database_dropper = database_dropper
+        suite.config['all_tests'] = all_tests
+        unit_start = time.time()
+        result = run_unittest_suite(
+            suite, coverage=coverage if impact else None, context_module=module
+        )
+        timings['unit'] = time.time() - unit_start
+        coverage.stop()
+        if impact and commit and result.wasSuccessful() and \
+                not (partial or tests or all_tests):
+            impact.record(coverage.get_data(), module_path, commit)
+            impact.save()
+        results.append(result.wasSuccessful())
+        if report_junitxml:
+            suite_name = module
+            if test_shard:
+                suite_name = '{}-shard{}of{}'.format(module, *test_shard)
+            junitxml_suites.append(result.get_test_suite(suite_name))
+    timings.update(suite.timings)
+    timings['tests'] = getattr(result, 'test_timings', {})
+    if not partial:
+        # Partial runs would spoil the estimates of the module
+        timings['total'] = time.time() - start
+    return results, junitxml_suites, timings
+
+
+def run_module_worker(args):
+    """Test a module inside a worker process.
+
+    Each worker has its own OpenERPService, database and coverage data file
+    (merged later with `OOCoverage.combine_run`).
+
+    :param args: tuple with the module and the options of the run
+    :return: a tuple with the list of results, the JUnitXML suites and the
+        timings of the module
+    """
+    module, options = args
+    service = OpenERPService()
+    coverage = OOCoverage(
+        data_suffix=run_data_suffix(options['coverage_run'], os.getpid()),
+        **options['coverage_config']
+    )
+    coverage.enabled = options['coverage_enabled']
+    try:
+        return_value = run_module_tests(
+            module, service, coverage, tests=options['tests'],
+            all_tests=options['all_tests'], dropdb=options['dropdb'],
+            report_junitxml=options['report_junitxml'],
+            test_shard=options['test_shard'],
+            test_durations=options['test_durations'],
+            impact_map=options['impact_map']
+        )
+    except Exception:
+        logger.exception('Error testing module %s', module)
+        return_value = [False], [], {}
+    if coverage.enabled:
+        start = time.time()
+        coverage.save()
+        if return_value[2]:
+            return_value[2]['coverage'] = time.time() - start
+    return return_value
+
+
+def run_forked_module_tests(forkserver, module, service, coverage_config,
+                            coverage_enabled, coverage_run, **kwargs):
+    """Test a module in a child of the fork server.
+
+    The child has its own coverage data file (merged later with
+    `OOCoverage.combine_run`) and drops its databases itself. When the child
+    fails, the parent drops the databases it created.
+
+    :param forkserver: ForkServer with the addons preloaded
+    :param coverage_run: Identifier of the run for the coverage data files
+    :param \**kwargs: keyword arguments passed to `run_module_tests`
+    :return: a tuple with the list of results, the JUnitXML suites and the
+        timings of the module
+    """
+    def child():
+        coverage = OOCoverage(
+            data_suffix=run_data_suffix(coverage_run, module),
+            **coverage_config
+        )
+        coverage.enabled = coverage_enabled
+        return_value = run_module_tests(module, service, coverage, **kwargs)
+        if coverage.enabled:
+            start = time.time()
+            coverage.save()
+            return_value[2]['coverage'] = time.time() - start
+        return return_value
+
+    start = time.time()
+    try:
+        return forkserver.run(child)
+    except RuntimeError as e:
+        logger.error('Error testing module %s: %s', module, e)
+        if kwargs.get('dropdb', True):
+            try:
+                cleanup_orphan_databases(
+                    0, pid=forkserver.pid, since=start
+                )
+            except Exception:
+                logger.exception(
+                    'Error dropping the databases of module %s', module
+                )
+        return [False], [], {}
+
+
+def get_lint_files(modules, addons_path, paths=None):
+    """Paths to lint.
+
+    :param modules: Modules tested
+    :param addons_path: Path to find the modules
+    :param paths: Files changed or None if unknown
+    :return: the changed python files of the modules or, when the changed
+        files are unknown, the module directories
+    """
+    modules_path = [os.path.join(addons_path, m) for m in modules]
+    if paths is None:
+        return modules_path
+    roots = [os.path.realpath(p) + os.sep for p in modules_path]
+    files = []
+    for path in paths:
+        if not path.endswith('.py') or not os.path.isfile(path):
+            continue
+        real_path = os.path.realpath(path)
+        if any(real_path.startswith(root) for root in roots):
+            files.append(path)
+    if not files:
+        logger.info('No python files changed in the modules, nothing to lint')
+    return files
+
+
+def validate_shard(ctx, param, value):
+    if value is None:
+        return value
+    try:
+        return parse_shard(value)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+
+def validate_durations(ctx, param, value):
+    if value is None:
+        return value
+    try:
+        return load_durations(value)
+    except (IOError, OSError, ValueError) as e:
+        raise click.BadParameter(str(e))
+
+
+def log_estimated_costs(modules, changed, history):
+    """Log the estimated duration of every module from previous runs.
+
+    :param modules: Modules to test
+    :param changed: Modules changed (the rest are dependents)
+    :param history: TimingHistory with the previous runs
+    """
+    total = 0
+    unknown = []
+    for module in modules:
+        estimate = history.estimate(module)
+        reason = 'changed' if module in changed else 'dependent'
+        if estimate is None:
+            unknown.append(module)
+            logger.info('Impact: %s (%s): no timings yet', module, reason)
+        else:
+            total += estimate
+            logger.info(
+                'Impact: %s (%s): ~%.1fs', module, reason, estimate
+            )
+    logger.info(
+        'Impact: %s modules, estimated %.1fs%s', len(modules), total,
+        ' (+{} without timings)'.format(len(unknown)) if unknown else ''
+    )
+
+
 @click.command(context_settings=dict(
     ignore_unknown_options=True,
     allow_extra_args=True))
@@ -33,24 +293,148 @@ logger = logging.getLogger('destral.cli')
 @click.option('--dropdb/--no-dropdb', default=True)
 @click.option('--requirements/--no-requirements', default=True)
 @click.option('--enable-lint', type=click.BOOL, default=False, is_flag=True)
+@click.option(
+    '--lint-jobs', type=click.INT, default=1,
+    help="Number of pylint processes"
+)
+@click.option(
+    '--lint-background', type=click.BOOL, default=False, is_flag=True,
+    help="Lint in a background process while the tests run"
+)
 @click.option('--constraints-file', type=click.STRING, nargs=1, default="")
 @click.option(
     '--coverage-html-report', type=click.STRING, nargs=1, default="", help="Coverage HTML report path"
 )
 @click.option('--coverage-without-test-lines', type=click.BOOL, default=True)
+@click.option(
+    '--jobs', '-j', type=click.INT, default=1,
+    help="Number of modules to test in parallel worker processes"
+)
+@click.option(
+    '--db-templates/--no-db-templates', default=False,
+    help="Reuse cached template databases with the dependencies installed"
+)
+@click.option(
+    '--max-db-templates', type=click.INT, default=5,
+    help="Maximum number of cached template databases"
+)
+@click.option(
+    '--impact', type=click.BOOL, default=False, is_flag=True,
+    help="Also test the modules depending on the changed modules"
+)
+@click.option(
+    '--impact-depth', type=click.INT, default=None,
+    help="Maximum dependency distance of the modules added by --impact"
+)
+@click.option(
+    '--pr-files-api', type=click.BOOL, default=False, is_flag=True,
+    help="List the pull request files with the GitHub API instead of its diff"
+)
+@click.option(
+    '--shard', type=click.STRING, default=None, callback=validate_shard,
+    help="Only test the shard i/N of the modules (see --durations)"
+)
+@click.option(
+    '--durations', type=click.Path(exists=True, dir_okay=False), default=None,
+    callback=validate_durations,
+    help="Durations file shared by all the shards (see destral-stats "
+         "--export-durations) to balance them"
+)
+@click.option(
+    '--shard-mode', type=click.Choice(['modules', 'tests']), default='modules',
+    help="Split the modules or the unit tests of every module in shards"
+)
+@click.option(
+    '--ephemeral-pg', type=click.BOOL, default=False, is_flag=True,
+    help="Run the tests in a throwaway PostgreSQL cluster in tmpfs without "
+         "durability"
+)
+@click.option(
+    '--async-dropdb', type=click.BOOL, default=False, is_flag=True,
+    help="Drop the databases of the tested modules in a background thread"
+)
+@click.option(
+    '--defer-dropdb', type=click.BOOL, default=False, is_flag=True,
+    help="Drop the databases of the tested modules at the end of the run"
+)
+@click.option(
+    '--drop-orphan-databases', type=click.FLOAT, default=None,
+    help="Drop the test databases older than these hours left by crashed runs"
+)
+@click.option(
+    '--pipeline', type=click.BOOL, default=False, is_flag=True,
+    help="Prepare the database of the next module while a module is tested "
+         "and drop the tested ones in the background"
+)
+@click.option(
+    '--forkserver', type=click.BOOL, default=False, is_flag=True,
+    help="Import the server and the addons once and test every module in a "
+         "forked child process"
+)
+@click.option(
+    '--fast-coverage', type=click.BOOL, default=False, is_flag=True,
+    help="Measure the coverage with the fastest tracer available and a data "
+         "file per module"
+)
+@click.option(
+    '--impact-map', type=click.BOOL, default=False, is_flag=True,
+    help="Only run the unit tests that executed the changed lines in the "
+         "coverage of a previous run (measures the coverage per test)"
+)
 def destral(modules, tests, all_tests=None, enable_coverage=None,
             report_coverage=None, report_junitxml=None, dropdb=None,
             requirements=None, **kwargs):
     os.environ['OPENERP_DESTRAL_MODE'] = "1"
+    os.environ['DESTRAL_MANIFEST_CACHE'] = 'True'
     enable_lint = kwargs.pop('enable_lint')
+    lint_jobs = kwargs.pop('lint_jobs')
+    lint_background = kwargs.pop('lint_background')
     constraints_file = kwargs.pop('constraints_file')
     coverage_html_report = kwargs.pop('coverage_html_report')
     database = kwargs.pop('database')
     coverage_no_test_lines = kwargs.pop('coverage_without_test_lines')
+    jobs = kwargs.pop('jobs')
+    impact = kwargs.pop('impact')
+    pr_files_api = kwargs.pop('pr_files_api')
+    impact_depth = kwargs.pop('impact_depth')
+    shard = kwargs.pop('shard')
+    module_durations, shared_test_durations = \
+        kwargs.pop('durations') or (None, None)
+    impact_map = kwargs.pop('impact_map')
+    fast_coverage = kwargs.pop('fast_coverage')
+    use_pipeline = kwargs.pop('pipeline')
+    use_forkserver = kwargs.pop('forkserver')
+    async_dropdb = kwargs.pop('async_dropdb')
+    defer_dropdb = kwargs.pop('defer_dropdb')
+    drop_orphan_databases = kwargs.pop('drop_orphan_databases')
+    test_shard = None
+    if kwargs.pop('shard_mode') == 'tests' and shard:
+        test_shard, shard = shard, None
+    if kwargs.pop('db_templates'):
+        os.environ['DESTRAL_TEMPLATE_CACHE'] = 'True'
+    os.environ['DESTRAL_MAX_TEMPLATES'] = str(kwargs.pop('max_db_templates'))
+    if database and jobs > 1:
+        logger.warning('A database is defined, running modules serially')
+        jobs = 1
     if database:
         os.environ['OPENERP_DB_NAME'] = database
+    if use_forkserver:
+        if jobs > 1:
+            raise click.BadParameter(
+                'can not be used with --jobs', param_hint='--forkserver'
+            )
+        # Their threads and processes would run while forking the children
+        if async_dropdb or defer_dropdb or use_pipeline:
+            raise click.BadParameter(
+                'can not be used with --async-dropdb, --defer-dropdb or '
+                '--pipeline', param_hint='--forkserver'
+            )
+    if kwargs.pop('ephemeral_pg'):
+        os.environ.update(EphemeralCluster().start())
     sys.argv = sys.argv[:1]
     service = OpenERPService()
+    addons_path = service.config['addons_path']
+    root_path = service.config['root_path']
     if report_junitxml:
         os.environ['DESTRAL_JUNITXML'] = report_junitxml
     else:
@@ -59,6 +443,7 @@ def destral(modules, tests, all_tests=None, enable_coverage=None,
         junitxml_directory = os.path.abspath(report_junitxml)
         if not os.path.isdir(junitxml_directory):
             os.makedirs(junitxml_directory)
+    paths = None
     if not modules:
         ci_pull_request = os.environ.get('CI_PULL_REQUEST')
         token = os.environ.get('GITHUB_TOKEN')
@@ -69,18 +454,9 @@ def destral(modules, tests, all_tests=None, enable_coverage=None,
             except:
                 # If CI_PULL_REQUEST contains URL instead of PR number, get it
                 ci_pull_request = ci_pull_request.split('/')[-1]
-            url = 'https://api.github.com/repos/{repo}/pulls/{pr_number}'.format(
-                repo=repository,
-                pr_number=ci_pull_request
-            )
-            req = requests.get(
-                url,
-                headers={
-                    'Authorization': 'token {0}'.format(token),
-                    'Accept': 'application/vnd.github.diff'
-                }
+            paths = get_pull_request_files(
+                repository, ci_pull_request, token, files_api=pr_files_api
             )
-            paths = find_files(req.text)
             logger.info('Files from Pull Request: {0}: {1}'.format(
                 ci_pull_request, ', '.join(paths)
             ))
@@ -92,24 +468,46 @@ def destral(modules, tests, all_tests=None, enable_coverage=None,
             logger.info('Files from last commit: {}'.format(
                 ', '.join(paths)
             ))
-        modules_to_test = []
-        for path in paths:
-            module = detect_module(path)
-            if module and module not in modules_to_test:
-                modules_to_test.append(module)
+        modules_to_test = list(detect_modules(paths))
         if not modules_to_test:
             modules_to_test = ['base']
+            impact = False
     else:
         modules_to_test = modules[:]
 
     results = []
-    addons_path = service.config['addons_path']
-    root_path = service.config['root_path']
+    history = TimingHistory()
+    # Never from the local history, it differs between the nodes
+    test_durations = shared_test_durations
+
+    if impact:
+        changed = modules_to_test
+        modules_to_test = get_impacted_modules(
+            changed, addons_path, depth=impact_depth
+        )
 
     # Sort modules by dependencies
     if modules_to_test:
         modules_to_test = sort_modules_by_dependencies(modules_to_test, addons_path)
 
+    if impact:
+        log_estimated_costs(modules_to_test, changed, history)
+
+    if shard and modules_to_test:
+        index, total = shard
+        if module_durations is None:
+            logger.info('No durations file, splitting the modules by name')
+        # Never from the local history, it differs between the nodes
+        shards, loads = split_modules(
+            modules_to_test, total, module_durations
+        )
+        for i, (shard_list, load) in enumerate(zip(shards, loads), 1):
+            logger.info('Shard %s/%s: ~%.1f %s', i, total, load,
+                        ','.join(shard_list))
+        modules_to_test = shards[index - 1]
+        if not modules_to_test:
+            logger.info('Nothing to test in shard %s/%s', index, total)
+
     if not modules_to_test:
         coverage_config = {
             'source': [root_path],
@@ -124,13 +522,25 @@ def destral(modules, tests, all_tests=None, enable_coverage=None,
     if coverage_no_test_lines:
         coverage_config['omit'].append('*/tests/*')
 
+    if fast_coverage and (enable_coverage or report_coverage or impact_map):
+        use_fast_core(dynamic_contexts=impact_map)
+    else:
+        fast_coverage = False
     coverage = OOCoverage(**coverage_config)
-    coverage.enabled = (enable_coverage or report_coverage)
+    if impact_map and not hasattr(coverage, 'switch_context'):
+        logger.warning('The installed coverage does not support --impact-map')
+        impact_map = False
+    coverage.enabled = (enable_coverage or report_coverage or impact_map)
+    # Prefix of the data files of the processes of this run
+    coverage_run = 'destral-{}-{}'.format(int(time.time()), os.getpid())
 
     junitxml_suites = []
 
     coverage.start()
-    server_spec_suite = get_spec_suite(root_path)
+    # The server specs only run in the first shard
+    server_spec_suite = (
+        (shard or test_shard or (1,))[0] == 1 and get_spec_suite(root_path)
+    )
     if server_spec_suite:
         logging.info('Spec testing for server')
         report = run_spec_suite(server_spec_suite)
@@ -140,39 +550,125 @@ def destral(modules, tests, all_tests=None, enable_coverage=None,
     coverage.stop()
     
     logger.info('Modules to test: {}'.format(','.join(modules_to_test)))
-    for module in modules_to_test:
-        with RestorePatchedRegisterAll():
-            if requirements:
-                install_requirements(module, addons_path, constraints_file=constraints_file)
-            spec_suite = get_spec_suite(os.path.join(addons_path, module))
-            if spec_suite:
-                logger.info('Spec testing module %s', module)
-                coverage.start()
-                report = run_spec_suite(spec_suite)
-                coverage.stop()
-                results.append(not len(report.failed_examples) > 0)
-                if report_junitxml:
-                    junitxml_suites += report.create_report_suites()
-            logger.info('Unit testing module %s', module)
-            os.environ['DESTRAL_MODULE'] = module
-            coverage.start()
+    lint_files = None
+    linter = None
+    if enable_lint:
+        lint_files = get_lint_files(modules_to_test, addons_path, paths)
+        if lint_files and lint_background:
+            linter = start_linter(lint_files, jobs=lint_jobs)
+    if requirements:
+        install_modules_requirements(
+            modules_to_test, addons_path, constraints_file=constraints_file
+        )
+    if drop_orphan_databases is not None:
+        cleanup_orphan_databases(drop_orphan_databases * 3600)
+    teardown = None
+    database_dropper = None
+    if (async_dropdb or defer_dropdb) and jobs == 1 and dropdb:
+        teardown = DatabaseTeardownQueue(defer=defer_dropdb)
+        database_dropper = teardown.put
+    pipeline = None
+    if use_pipeline and jobs == 1 and dropdb and not database and \
+            modules_to_test:
+        pipeline = DatabasePipeline()
+        pipeline.prepare(modules_to_test[0], tests)
+        database_dropper = database_dropper or pipeline.drop
+    modules_timings = {}
+    run_timings = {}
+    forkserver = None
+    if use_forkserver and modules_to_test:
+        forkserver = ForkServer()
+        start = time.time()
+        forkserver.preload(modules_to_test, addons_path)
+        run_timings['preload'] = time.time() - start
+    if jobs > 1:
+        worker_options = {
+            'tests': tests,
+            'all_tests': all_tests,
+            'dropdb': dropdb,
+            'report_junitxml': report_junitxml,
+            'coverage_config': coverage_config,
+            'coverage_enabled': coverage.enabled,
+            'coverage_run': coverage_run,
+            'test_shard': test_shard,
+            'test_durations': test_durations,
+            'impact_map': impact_map,
+        }
+        # Longest modules first so they don't end the run alone, but after
+        # the modules they depend on
+        dispatch = sorted(
+            modules_to_test, key=lambda m: -history.estimate(m, default=0)
+        )
+        graph = ModuleGraph.get(addons_path)
+        after = []
+        for module in dispatch:
             try:
-                suite = get_unittest_suite(module, tests)
-            except Exception as e:
-                logger.error('Suite not found: {}'.format(e))
-                service.shutdown(1)
-            suite.drop_database = dropdb
-            suite.config['all_tests'] = all_tests
-            if all_tests:
-                for m in get_dependencies(module, addons_path):
-                    for test in get_unittest_suite(m):
-                        if test not in suite:
-                            suite.addTest(test)
-            result = run_unittest_suite(suite)
-            coverage.stop()
-            results.append(result.wasSuccessful())
-            if report_junitxml:
-                junitxml_suites.append(result.get_test_suite(module))
+                dependencies = graph.dependencies(module)
+            except Exception:
+                dependencies = set()
+            after.append([
+                i for i, m in enumerate(dispatch) if m in dependencies
+            ])
+        for module, (module_results, module_suites, timings) in zip(
+                dispatch, run_in_pool(
+                    run_module_worker,
+                    [(m, worker_options) for m in dispatch],
+                    jobs, after=after)):
+            results += module_results
+            junitxml_suites += module_suites
+            if timings:
+                modules_timings[module] = timings
+        if coverage.enabled:
+            coverage.combine_run(coverage_run)
+    else:
+        for index, module in enumerate(modules_to_test):
+            prepared_database, prepared_timings, prepared_demo = None, {}, False
+            if pipeline is not None:
+                prepared_database, prepared_timings, prepared_demo = \
+                    pipeline.get(module)
+                if index + 1 < len(modules_to_test):
+                    pipeline.prepare(modules_to_test[index + 1], tests)
+            module_options = dict(
+                tests=tests, all_tests=all_tests, dropdb=dropdb,
+                report_junitxml=report_junitxml, test_shard=test_shard,
+                test_durations=test_durations, impact_map=impact_map,
+                prepared_database=prepared_database,
+                prepared_demo=prepared_demo,
+                database_dropper=database_dropper
+            )
+            if forkserver is not None:
+                module_results, module_suites, timings = \
+                    run_forked_module_tests(
+                        forkserver, module, service, coverage_config,
+                        coverage.enabled, coverage_run, **module_options
+                    )
+            else:
+                module_coverage = coverage
+                if fast_coverage:
+                    # Own data file per module, combined at the end
+                    module_coverage = OOCoverage(
+                        data_suffix=run_data_suffix(coverage_run, module),
+                        **coverage_config
+                    )
+                module_results, module_suites, timings = run_module_tests(
+                    module, service, module_coverage, **module_options
+                )
+                if fast_coverage:
+                    start = time.time()
+                    module_coverage.save()
+                    timings['coverage'] = time.time() - start
+            timings.update(prepared_timings)
+            results += module_results
+            junitxml_suites += module_suites
+            modules_timings[module] = timings
+        if fast_coverage or (forkserver is not None and coverage.enabled):
+            coverage.combine_run(coverage_run)
+        if pipeline is not None:
+            pipeline.close()
+        if teardown is not None:
+            start = time.time()
+            teardown.close()
+            run_timings['drop_databases'] = time.time() - start
     if report_junitxml:
         from junit_xml import TestSuite
         for suite in junitxml_suites:
@@ -181,17 +677,27 @@ def destral(modules, tests, all_tests=None, enable_coverage=None,
             ) as report_file:
                 report_file.write(TestSuite.to_xml_string([suite]))
         logger.info('Saved report XML on {}/'.format(report_junitxml))
+    start = time.time()
     if report_coverage:
         coverage.report()
     if enable_coverage:
         coverage.save()
     if coverage.enabled and coverage_html_report:
         coverage.html_report(directory=coverage_html_report)
+    if coverage.enabled:
+        run_timings['coverage'] = time.time() - start
 
-    if enable_lint:
-        modules_path = ['{}/{}'.format(addons_path, m) for m in modules_to_test]
-        if modules_path:
-            run_linter(modules_path)
+    if linter is not None:
+        start = time.time()
+        linter.join()
+        run_timings['lint'] = time.time() - start
+    elif lint_files:
+        start = time.time()
+        run_linter(lint_files, jobs=lint_jobs)
+        run_timings['lint'] = time.time() - start
+
+    history.add_run(modules_timings, phases=run_timings)
+    history.save()
 
     return_code = 0
     if not all(results):
@@ -201,5 +707,67 @@ def destral(modules, tests, all_tests=None, enable_coverage=None,
     sys.exit(return_code)
 
 
+PHASES = (
+    'create_database', 'install', 'spec', 'unit', 'coverage', 'drop_database'
+)
+"""Module phases shown by `destral-stats`
+"""
+
+
+@click.command()
+@click.option('--top', type=click.INT, default=10,
+              help="Number of modules and tests to show")
+@click.option('--last', type=click.INT, default=5,
+              help="Number of recent runs averaged")
+@click.option('--module', '-m', 'modules', multiple=True,
+              help="Show the trend of these modules")
+@click.option('--export-durations', type=click.Path(dir_okay=False),
+              default=None,
+              help="Write the mean durations to this file, to be shared by "
+                   "the shards of a run (destral --durations)")
+def stats(top, last, modules, export_durations):
+    """Show the slowest modules and tests of the previous runs."""
+    history = TimingHistory()
+    if not history.runs:
+        click.echo('No timings recorded yet')
+        return
+    if export_durations:
+        history.export_durations(export_durations, last=last)
+        click.echo('Durations written to {}'.format(export_durations))
+    click.echo('{} runs recorded, averaging the last {}'.format(
+        len(history.runs), last
+    ))
+    click.echo('\nSlowest modules:')
+    for module, estimate in history.slowest_modules(top, last):
+        phases = []
+        for phase in PHASES:
+            durations = history.durations(module, phase)[-last:]
+            if durations:
+                phases.append('{} {:.1f}s'.format(
+                    phase, sum(durations) / len(durations)
+                ))
+        click.echo('  {:>8.1f}s  {}  ({})'.format(
+            estimate, module, ', '.join(phases)
+        ))
+    click.echo('\nSlowest tests:')
+    for test_id, mean in history.slowest_tests(top, last):
+        click.echo('  {:>8.2f}s  {}'.format(mean, test_id))
+    if not modules:
+        modules = [m for m, _ in history.slowest_modules(top, last)]
+    click.echo('\nTrends (oldest to newest):')
+    for module in modules:
+        durations = history.durations(module)
+        if not durations:
+            continue
+        trend = ''
+        if len(durations) > 1 and durations[0]:
+            trend = ' ({:+.0f}%)'.format(
+                (durations[-1] - durations[0]) * 100.0 / durations[0]
+            )
+        click.echo('  {}: {}{}'.format(
+            module, ' '.join('{:.1f}'.format(d) for d in durations), trend
+        ))
+
+
 if __name__ == '__main__':
     destral()
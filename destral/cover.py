@@ -1,6 +1,9 @@
 # coding=utf-8
 from __future__ import absolute_import
+import glob
 import logging
+import os
+import sys
 
 from coverage import Coverage, CoverageException
 
@@ -27,3 +30,52 @@ class OOCoverage(Coverage):
             except CoverageException as e:
                 logger.error(e)
                 return None
+
+    def combine_run(self, run_id):
+        """Combine the data files of a run.
+
+        Only the data files with a suffix starting with `run_id` (see
+        :func:`run_data_suffix`) are combined, so the files left by other or
+        crashed runs are not merged.
+
+        :param run_id: Identifier of the run
+        """
+        data_file = os.path.abspath(self.config.data_file)
+        paths = glob.glob('{}.{}.*'.format(data_file, run_id))
+        if paths:
+            self.combine(data_paths=paths)
+
+
+def run_data_suffix(run_id, name):
+    """Data file suffix of a process of a run.
+
+    :param run_id: Identifier of the run
+    :param name: Unique name of the data file in the run
+    """
+    return '{}.{}'.format(run_id, name)
+
+
+def use_fast_core(dynamic_contexts=False):
+    """Select the fastest coverage measurement core available.
+
+    `sys.monitoring` on Python 3.12 or newer (when no dynamic contexts are
+    needed, it does not support them) or the C tracer otherwise. Sets
+    `COVERAGE_CORE`, so it must be called before creating the coverage
+    objects; worker processes inherit it.
+
+    :param dynamic_contexts: Will the contexts be switched per test?
+    :return: the core name or None if only the python tracer is available
+    """
+    core = None
+    if sys.version_info >= (3, 12) and not dynamic_contexts:
+        core = 'sysmon'
+    else:
+        try:
+            from coverage.tracer import CTracer
+            core = 'ctrace'
+        except ImportError:
+            logger.warning('Coverage C tracer not available')
+    if core:
+        os.environ['COVERAGE_CORE'] = core
+        logger.info('Using coverage core %s', core)
+    return core
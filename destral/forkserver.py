@@ -0,0 +1,139 @@
+# coding=utf-8
+import logging
+import os
+import sys
+import traceback
+
+from six.moves import cPickle as pickle
+
+from destral.utils import ModuleGraph
+
+logger = logging.getLogger('destral.forkserver')
+
+_inherited_connections = []
+"""Database connections of the parent kept alive in a child (see
+:func:`forget_inherited_connections`)
+"""
+
+
+def forget_inherited_connections():
+    """Stop using the database connections inherited from the parent.
+
+    The connection pool of a forked child shares the sockets of the parent.
+    Closing them would terminate the sessions of the parent, so they are
+    kept referenced (never garbage collected) and the child opens its own.
+    Nothing to do if the parent never imported `sql_db`.
+    """
+    sql_db = sys.modules.get('sql_db')
+    pool = getattr(sql_db, '_Pool', None)
+    connections = getattr(pool, '_connections', None)
+    if connections:
+        _inherited_connections.append(connections)
+        pool._connections = []
+
+
+class ForkServer(object):
+    """Run every module in a copy-on-write child of a warm process.
+
+    The process creating the server (the parent) imports the OpenERP server
+    (:class:`destral.openerp.OpenERPService`) and, with :meth:`preload`, the
+    python code of the addons the modules depend on. :meth:`run` forks a
+    child that starts with all of it imported, runs a function and sends
+    its result back over a pipe. The child exits without running the exit
+    handlers of the parent, so the OpenERP state of a module (registries,
+    services, patches) never reaches the next one.
+
+    The parent must not run other threads or worker processes (like the
+    database teardown thread or the database pipeline) while it forks: a
+    child could inherit a lock held by one of them and deadlock. The
+    database connections of the parent are never used by the children (see
+    :func:`forget_inherited_connections`).
+    """
+
+    def __init__(self):
+        self.preloaded = []
+        """Pid of the last child, to clean up what it left when it fails"""
+        self.pid = None
+
+    def preload(self, modules, addons_path):
+        """Import the python code of the dependencies of the modules.
+
+        The addons are registered with the OpenERP loader, so the children
+        don't import them again when they load a database.
+
+        :param modules: Modules to test
+        :param addons_path: Path to find the modules
+        :return: a list with the preloaded addons
+        """
+        import addons
+        graph = ModuleGraph.get(addons_path)
+        dependencies = set()
+        for module in modules:
+            try:
+                dependencies.update(graph.dependencies(module))
+            except Exception as e:
+                logger.warning('Not preloading dependencies of %s: %s',
+                               module, e)
+        for module in graph.sort(sorted(dependencies)):
+            try:
+                addons.register_class(module)
+            except Exception:
+                logger.exception('Error preloading addon %s', module)
+            else:
+                self.preloaded.append(module)
+        logger.info('Preloaded addons: %s', ','.join(self.preloaded))
+        return self.preloaded
+
+    def run(self, func, *args, **kwargs):
+        """Call a function in a new child and wait for it.
+
+        :param func: Callable to run in the child, returning a picklable
+            value
+        :return: the value returned by `func`
+        :raises RuntimeError: if `func` raised or the child died without
+            sending its result
+        """
+        read_fd, write_fd = os.pipe()
+        # Buffered output would be written by both processes
+        sys.stdout.flush()
+        sys.stderr.flush()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            self._child(write_fd, func, args, kwargs)
+        self.pid = pid
+        os.close(write_fd)
+        with os.fdopen(read_fd, 'rb') as reader:
+            data = reader.read()
+        _, status = os.waitpid(pid, 0)
+        try:
+            success, value = pickle.loads(data)
+        except Exception:
+            raise RuntimeError(
+                'Child {} exited with status {} without a result'.format(
+                    pid, status
+                )
+            )
+        if not success:
+            raise RuntimeError(value)
+        return value
+
+    @staticmethod
+    def _child(write_fd, func, args, kwargs):
+        exit_code = 1
+        try:
+            forget_inherited_connections()
+            try:
+                payload = True, func(*args, **kwargs)
+            except Exception:
+                payload = False, traceback.format_exc()
+            data = pickle.dumps(payload, pickle.HIGHEST_PROTOCOL)
+            with os.fdopen(write_fd, 'wb') as writer:
+                writer.write(data)
+            exit_code = 0
+        except Exception:
+            logger.exception('Error in fork server child %s', os.getpid())
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(exit_code)
@@ -0,0 +1,185 @@
+# coding=utf-8
+import json
+import logging
+import os
+import time
+
+from destral.utils import get_cache_dir, write_json_atomic
+
+logger = logging.getLogger('destral.history')
+
+DURATIONS_VERSION = 1
+"""Version of the durations files (see :func:`load_durations`)
+"""
+
+
+def load_durations(path):
+    """Load a durations file.
+
+    Durations files are exported with
+    :meth:`TimingHistory.export_durations` and shared by all the nodes of a
+    sharded CI run (committed to the repository or passed as an artifact),
+    so every node splits the modules and tests the same way.
+
+    :param path: JSON file
+    :return: a tuple with the dictionaries of the module durations and the
+        test durations by id
+    :raises ValueError: if the file is not a valid durations file
+    """
+    with open(path, 'r') as durations_file:
+        data = json.load(durations_file)
+    if not isinstance(data, dict) or \
+            data.get('version') != DURATIONS_VERSION:
+        raise ValueError('{} is not a durations file'.format(path))
+    return data.get('modules', {}), data.get('tests', {})
+
+
+class TimingHistory(object):
+    """Timings of the previous destral runs.
+
+    Stored as JSON in the destral cache directory. Every run keeps, per
+    module, a dictionary with its timings in seconds: `total` is the wall
+    clock of the module, the phases (`create_database`, `install`, `spec`,
+    `unit`, `coverage` and `drop_database`) and `tests`, the durations of
+    every test by id. Run wide phases (`preload`, `coverage`, `lint` and
+    `drop_databases`) are kept in `phases`. Only the last `max_runs` runs
+    are kept.
+
+    :param path: JSON file (`history.json` in the cache directory by default)
+    :param max_runs: Number of runs to keep
+    """
+
+    VERSION = 1
+
+    def __init__(self, path=None, max_runs=50):
+        if path is None:
+            path = os.path.join(get_cache_dir(), 'history.json')
+        self.path = path
+        self.max_runs = max_runs
+        self.runs = []
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as history_file:
+                    data = json.load(history_file)
+                if data.get('version') == self.VERSION:
+                    self.runs = data['runs']
+            except ValueError:
+                logger.warning('Ignoring corrupted history %s', path)
+
+    def add_run(self, modules, date=None, phases=None):
+        """Add the timings of a run.
+
+        :param modules: dictionary with the timings of every module
+        :param date: timestamp of the run (now by default)
+        :param phases: dictionary with the timings of the run wide phases
+        """
+        if not modules:
+            return
+        self.runs.append({
+            'date': date or time.time(),
+            'modules': modules,
+            'phases': phases or {}
+        })
+        self.runs = self.runs[-self.max_runs:]
+
+    def durations(self, module, phase='total'):
+        """Durations of a module, from the oldest to the newest run.
+
+        :param module: Module name
+        :param phase: Timing to get (`total` by default)
+        """
+        return [
+            run['modules'][module][phase] for run in self.runs
+            if phase in run['modules'].get(module, {})
+        ]
+
+    def modules(self):
+        """Modules with timings.
+        """
+        modules = set()
+        for run in self.runs:
+            modules.update(run['modules'])
+        return modules
+
+    def test_durations(self, last=5):
+        """Durations of every test in the last runs.
+
+        :param last: Number of recent runs
+        :return: a dictionary with the test ids and the list of durations
+        """
+        durations = {}
+        for run in self.runs[-last:]:
+            for timings in run['modules'].values():
+                for test_id, duration in timings.get('tests', {}).items():
+                    durations.setdefault(test_id, []).append(duration)
+        return durations
+
+    def slowest_modules(self, top=10, last=5):
+        """Modules with the highest estimated duration.
+
+        :return: a list of tuples with the module and its mean duration
+        """
+        estimates = [
+            (module, self.estimate(module, last=last))
+            for module in self.modules()
+        ]
+        estimates = [e for e in estimates if e[1] is not None]
+        estimates.sort(key=lambda e: (-e[1], e[0]))
+        return estimates[:top]
+
+    def slowest_tests(self, top=10, last=5):
+        """Tests with the highest mean duration in the last runs.
+
+        :return: a list of tuples with the test id and its mean duration
+        """
+        means = [
+            (test_id, sum(durations) / len(durations))
+            for test_id, durations in self.test_durations(last).items()
+        ]
+        means.sort(key=lambda m: (-m[1], m[0]))
+        return means[:top]
+
+    def estimate(self, module, default=None, last=5):
+        """Estimated duration of a module.
+
+        :param module: Module name
+        :param default: Value returned when the module has no history
+        :param last: Number of recent runs to average
+        :return: the mean duration of the last runs in seconds
+        """
+        durations = self.durations(module)[-last:]
+        if not durations:
+            return default
+        return sum(durations) / len(durations)
+
+    def export_durations(self, path, last=5):
+        """Write the mean durations of the modules and the tests.
+
+        :param path: JSON file (see :func:`load_durations`)
+        :param last: Number of recent runs to average
+        """
+        modules = dict(
+            (module, self.estimate(module, last=last))
+            for module in self.modules()
+        )
+        tests = dict(
+            (test_id, sum(durations) / len(durations))
+            for test_id, durations in self.test_durations(last).items()
+        )
+        write_json_atomic(path, {
+            'version': DURATIONS_VERSION,
+            'modules': dict((m, d) for m, d in modules.items()
+                            if d is not None),
+            'tests': tests
+        })
+
+    def save(self):
+        """Persist the history.
+        """
+        try:
+            write_json_atomic(self.path, {
+                'version': self.VERSION,
+                'runs': self.runs
+            })
+        except (IOError, OSError, TypeError, ValueError) as e:
+            logger.warning('Could not save history %s: %s', self.path, e)
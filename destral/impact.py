@@ -0,0 +1,257 @@
+# coding=utf-8
+import json
+import logging
+import os
+import re
+import subprocess
+
+from destral.utils import get_cache_dir, write_json_atomic
+
+logger = logging.getLogger('destral.impact')
+
+CONTEXT_SEPARATOR = '|'
+"""Separator of the module and the test id in the coverage contexts
+"""
+
+HUNK_RE = re.compile(r'^@@ -(\d+)(?:,(\d+))? \+\d+(?:,\d+)? @@')
+"""Hunk header of an unified diff, capturing the old side lines
+"""
+
+
+def coverage_test_context(module, test_id):
+    """Coverage context of a test of a module.
+    """
+    return '{}{}{}'.format(module, CONTEXT_SEPARATOR, test_id)
+
+
+def git_output(args, cwd):
+    """Output of a git command or None if it fails.
+    """
+    try:
+        with open(os.devnull, 'w') as devnull:
+            output = subprocess.check_output(
+                ['git'] + args, cwd=cwd, stderr=devnull
+            )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.decode('utf-8', 'replace')
+
+
+def parse_diff_lines(diff):
+    """Lines changed in the old side of an unified diff with no context.
+
+    Pure insertions mark the lines around the insertion point.
+
+    :param diff: Output of `git diff -U0`
+    :return: a dictionary with the paths (relative to the diff) and the set
+        of changed lines
+    """
+    changed = {}
+    path = None
+    in_header = False
+    for line in diff.splitlines():
+        if line.startswith('diff --git '):
+            in_header = True
+            path = None
+        elif in_header and line.startswith('--- '):
+            path = line[4:]
+            if path.startswith('a/'):
+                path = path[2:]
+        elif in_header and line.startswith('+++ '):
+            if path == '/dev/null' and line.startswith('+++ b/'):
+                # Added file, nothing recorded for it
+                path = line[6:]
+            if path is not None:
+                changed.setdefault(path, set())
+        elif path is not None:
+            match = HUNK_RE.match(line)
+            if match:
+                in_header = False
+                start = int(match.group(1))
+                count = int(match.group(2) or 1)
+                if count:
+                    changed[path].update(range(start, start + count))
+                else:
+                    changed[path].update((start, start + 1))
+    changed.pop('/dev/null', None)
+    return changed
+
+
+class ImpactMap(object):
+    """Lines of a module executed by each of its unit tests.
+
+    Recorded from the coverage contexts (see :func:`coverage_test_context`)
+    of a full run of the module tests, at a clean git commit. The tests to
+    run for a change are the ones that executed one of the lines changed
+    since that commit. When there are no changes in the module (it is tested
+    for a change in its dependencies) or the change can not be mapped to
+    tests (a changed file that is not python, a file without recorded lines,
+    a new line or one no test executed, or a line executed outside the
+    tests, like module imports) the whole suite has to run.
+
+    Stored as JSON in the destral cache directory.
+
+    :param module: Module name
+    :param path: JSON file (`impact-<module>.json` in the cache directory by
+        default)
+    """
+
+    VERSION = 1
+
+    def __init__(self, module, path=None):
+        if path is None:
+            path = os.path.join(
+                get_cache_dir(), 'impact-{}.json'.format(module)
+            )
+        self.module = module
+        self.path = path
+        self.commit = None
+        self.tests = []
+        self.files = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r') as impact_file:
+                    data = json.load(impact_file)
+                if data.get('version') == self.VERSION:
+                    self.commit = data['commit']
+                    self.tests = data['tests']
+                    self.files = data['files']
+            except ValueError:
+                logger.warning('Ignoring corrupted impact map %s', path)
+
+    @staticmethod
+    def clean_commit(module_path):
+        """Commit of a module checkout without local changes.
+
+        :param module_path: Module directory
+        :return: the commit hash or None if it can not be known or the
+            module has local changes
+        """
+        status = git_output(
+            ['status', '--porcelain', '--untracked-files=normal', '.'],
+            module_path
+        )
+        if status is None:
+            return None
+        for line in status.splitlines():
+            if not line.rstrip('/').endswith(('.pyc', '.pyo', '__pycache__')):
+                return None
+        commit = git_output(['rev-parse', 'HEAD'], module_path)
+        return commit.strip() if commit else None
+
+    def record(self, data, module_path, commit):
+        """Build the map from the coverage data of a full run.
+
+        :param data: CoverageData recorded with the contexts of
+            :func:`coverage_test_context`
+        :param module_path: Module directory
+        :param commit: Commit of the module when the tests ran
+        """
+        prefix = coverage_test_context(self.module, '')
+        module_path = os.path.realpath(module_path)
+        tests = []
+        test_index = {}
+        files = {}
+        for filename in data.measured_files():
+            relpath = os.path.relpath(os.path.realpath(filename), module_path)
+            if relpath.startswith(os.pardir):
+                continue
+            lines = {}
+            # Contexts of the tests of other modules are ignored
+            for lineno, contexts in data.contexts_by_lineno(filename).items():
+                indexes = []
+                for context in contexts:
+                    if context.startswith(prefix):
+                        test_id = context[len(prefix):]
+                        if test_id not in test_index:
+                            test_index[test_id] = len(tests)
+                            tests.append(test_id)
+                        indexes.append(test_index[test_id])
+                    elif CONTEXT_SEPARATOR not in context:
+                        # Executed outside the tests (-1)
+                        indexes.append(-1)
+                lines[str(lineno)] = sorted(set(indexes))
+            files[relpath] = lines
+        self.commit = commit
+        self.tests = tests
+        self.files = files
+
+    def select_tests(self, module_path):
+        """Tests impacted by the changes of a module since the map commit.
+
+        :param module_path: Module directory
+        :return: a set with the test ids or None if the whole suite has to
+            run
+        """
+        if not self.commit:
+            logger.info('No impact map for module %s', self.module)
+            return None
+        diff = git_output(
+            ['diff', '-U0', '--no-color', '--no-renames', '--relative',
+             self.commit, '--', '.'],
+            module_path
+        )
+        untracked = git_output(
+            ['ls-files', '--others', '--exclude-standard', '.'], module_path
+        )
+        if diff is None or untracked is None:
+            logger.info(
+                'Impact map of module %s is stale (commit %s)',
+                self.module, self.commit
+            )
+            return None
+        changed = parse_diff_lines(diff)
+        for path in untracked.splitlines():
+            if not path.endswith(('.pyc', '.pyo')):
+                changed.setdefault(path, set())
+        if not changed:
+            # Nothing to select from, run (and refresh the map with) the
+            # whole suite: the module may be tested for its dependencies
+            logger.info(
+                'No changes in module %s since the impact map', self.module
+            )
+            return None
+        selected = set()
+        for path, lines in changed.items():
+            recorded = self.files.get(path)
+            if not path.endswith('.py') or recorded is None:
+                logger.info(
+                    'Change in %s not in the impact map of module %s',
+                    path, self.module
+                )
+                return None
+            for lineno in lines:
+                indexes = recorded.get(str(lineno))
+                if not indexes:
+                    # A new line or one no test runs, no test would catch
+                    # its errors
+                    logger.info(
+                        'Change in %s:%s is not run by the tests of module %s',
+                        path, lineno, self.module
+                    )
+                    return None
+                if -1 in indexes:
+                    logger.info(
+                        'Change in %s:%s runs outside the tests of module %s',
+                        path, lineno, self.module
+                    )
+                    return None
+                selected.update(self.tests[i] for i in indexes)
+        logger.info(
+            'Impact map of module %s selects %s of %s tests',
+            self.module, len(selected), len(self.tests)
+        )
+        return selected
+
+    def save(self):
+        """Persist the map.
+        """
+        try:
+            write_json_atomic(self.path, {
+                'version': self.VERSION,
+                'commit': self.commit,
+                'tests': self.tests,
+                'files': self.files
+            })
+        except (IOError, OSError, TypeError, ValueError) as e:
+            logger.warning('Could not save impact map %s: %s', self.path, e)
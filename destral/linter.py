@@ -1,5 +1,6 @@
 # coding=utf-8
 import logging
+import multiprocessing
 
 from pylint.reporters.text import ColorizedTextReporter
 from pylint.lint import PyLinter
@@ -9,7 +10,13 @@ from pylint.config import find_pylintrc
 logger = logging.getLogger(__name__)
 
 
-def run_linter(files=None):
+def run_linter(files=None, jobs=1):
+    """Lint files or module directories with pylint.
+
+    :param files: Paths to lint
+    :param jobs: Number of pylint processes. With more than one, pylint
+        checks the files in parallel and merges the reports.
+    """
     if files is None:
         return
     logger.info('Linting {}'.format(', '.join(files)))
@@ -20,5 +27,21 @@ def run_linter(files=None):
     linter.enable('c-extension-no-member')
     linter.read_config_file()
     linter.load_config_file()
+    if jobs > 1:
+        linter.set_option('jobs', jobs)
     linter.check(files)
     linter.generate_reports()
+
+
+def start_linter(files=None, jobs=1):
+    """Run the linter in a background process.
+
+    :param files: Paths to lint
+    :param jobs: Number of pylint processes
+    :return: the started process, `join` it to wait for the linter
+    """
+    process = multiprocessing.Process(
+        target=run_linter, args=(files, jobs), name='destral-linter'
+    )
+    process.start()
+    return process
@@ -1,4 +1,7 @@
 import logging
+import os
+import re
+import threading
 import time
 
 from osconf import config_from_environment
@@ -6,6 +9,7 @@ from typing import Optional
 
 from destral.utils import update_config
 import psycopg2
+from six.moves import queue
 
 from osv.osv import osv_pool
 from sql_db import Connection
@@ -23,6 +27,150 @@ def patched_pool_jobs(*args, **kwargs):
     return False
 
 
+def disconnect_sessions(cursor, db_name):
+    """Disconnect all the sessions from a database
+
+    :param cursor: Cursor of a maintenance database
+    :param db_name: Database to disconnect
+    """
+    logger.info('Disconnect all sessions from database %s', db_name)
+    cursor.execute(
+        "SELECT pg_terminate_backend(pg_stat_activity.pid) "
+        " FROM pg_stat_activity "
+        " WHERE pg_stat_activity.datname = '{}'"
+        " AND pid <> pg_backend_pid() ".format(db_name)
+    )
+
+
+TEST_DATABASE_RE = re.compile(r'^test_(\d{10})(?:_(\d+))?$')
+"""Names of the test databases created by destral (`test_<epoch>` or
+`test_<epoch>_<pid>`), capturing their creation timestamp and the pid of
+the process creating them
+"""
+
+
+class DatabaseTeardownQueue(object):
+    """Drop databases in a background thread.
+
+    The databases are dropped in order over a single maintenance connection
+    reused for all of them. With `defer` the databases are only dropped
+    when the queue is closed, at the end of the run.
+
+    :param defer: Drop the databases when the queue is closed
+    """
+
+    def __init__(self, defer=False):
+        self.defer = defer
+        self.deferred = []
+        self.queue = queue.Queue()
+        self.thread = None
+
+    def put(self, db_name):
+        """Hand a database to drop.
+        """
+        import sql_db
+        sql_db.close_db(db_name)
+        if self.defer:
+            logger.info('Database %s will be dropped at the end', db_name)
+            self.deferred.append(db_name)
+            return
+        self._start()
+        self.queue.put(db_name)
+
+    def close(self):
+        """Drop the deferred databases and wait for all the drops.
+        """
+        if self.deferred:
+            self._start()
+            for db_name in self.deferred:
+                self.queue.put(db_name)
+            self.deferred = []
+        if self.thread is not None:
+            self.queue.put(None)
+            self.thread.join()
+            self.thread = None
+
+    def _start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(
+                target=self._run, name='destral-teardown'
+            )
+            self.thread.daemon = True
+            self.thread.start()
+
+    def _run(self):
+        import sql_db
+        cursor = None
+        while True:
+            db_name = self.queue.get()
+            if db_name is None:
+                break
+            try:
+                if cursor is None:
+                    cursor = sql_db.db_connect('template1').cursor()
+                    cursor.autocommit(True)
+                start = time.time()
+                disconnect_sessions(cursor, db_name)
+                cursor.execute('DROP DATABASE IF EXISTS ' + db_name)
+                logger.info(
+                    'Database %s dropped in %.1fs', db_name, time.time() - start
+                )
+            except Exception:
+                logger.exception('Error dropping database %s', db_name)
+                if cursor is not None:
+                    cursor.close()
+                    cursor = None
+        if cursor is not None:
+            cursor.close()
+
+
+def cleanup_orphan_databases(max_age, teardown=None, pid=None, since=None):
+    """Drop the test databases left by crashed runs.
+
+    :param max_age: Minimum age in seconds of the databases to drop
+    :param teardown: DatabaseTeardownQueue to use (a new one, closed before
+        returning, by default)
+    :param pid: Only drop the databases created by this (dead) process,
+        whatever their age. Pids repeat between hosts and containers sharing
+        the server, so only the databases created since `since`
+    :param since: Timestamp when the process `pid` started
+    :return: a list with the databases dropped
+    """
+    import sql_db
+    cursor = sql_db.db_connect('template1').cursor()
+    try:
+        cursor.execute(
+            "SELECT datname FROM pg_database WHERE datname LIKE %s",
+            ('test\\_%',)
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+    now = time.time()
+    orphans = []
+    for name in names:
+        match = TEST_DATABASE_RE.match(name)
+        if not match:
+            continue
+        if pid is not None:
+            orphan = match.group(2) == str(pid) and \
+                int(match.group(1)) >= int(since)
+        else:
+            orphan = now - int(match.group(1)) > max_age
+        if orphan:
+            orphans.append(name)
+    if orphans:
+        logger.info('Dropping orphan databases %s', ', '.join(orphans))
+        queue_owner = teardown is None
+        if queue_owner:
+            teardown = DatabaseTeardownQueue()
+        for name in orphans:
+            teardown.put(name)
+        if queue_owner:
+            teardown.close()
+    return orphans
+
+
 class OpenERPService(object):
     """OpenERP Service.
     """
@@ -64,9 +212,13 @@ class OpenERPService(object):
         """Creates a new database.
 
         :param template: use a template (name must be `base`) (default True)
+            or the name of the template database to copy
         """
         if db_name is None:
-            db_name = 'test_' + str(int(time.time()))
+            # The pid avoids collisions between parallel workers
+            db_name = 'test_{}_{}'.format(int(time.time()), os.getpid())
+        if template is True:
+            template = 'base'
         import sql_db
         conn = sql_db.db_connect('postgres')
         cursor = conn.cursor()
@@ -74,8 +226,8 @@ class OpenERPService(object):
             logger.info('Creating database %s', db_name)
             cursor.autocommit(True)
             if template:
-                cursor.execute('CREATE DATABASE {} WITH TEMPLATE base'.format(
-                    db_name
+                cursor.execute('CREATE DATABASE {} WITH TEMPLATE {}'.format(
+                    db_name, template
                 ))
             else:
                 cursor.execute('CREATE DATABASE {}'.format(db_name))
@@ -84,24 +236,22 @@ class OpenERPService(object):
             cursor.close()
             sql_db.close_db('postgres')
 
-    def drop_database(self):
+    def drop_database(self, db_name=None):
         """Drop database from `self.db_name`
+
+        :param db_name: Database to drop instead of `self.db_name`
         """
         import sql_db
-        sql_db.close_db(self.db_name)
+        if db_name is None:
+            db_name = self.db_name
+        sql_db.close_db(db_name)
         conn = sql_db.db_connect('template1')
         cursor = conn.cursor()
         try:
-            logger.info('Droping database %s', self.db_name)
+            logger.info('Droping database %s', db_name)
             cursor.autocommit(True)
-            logger.info('Disconnect all sessions from database %s', self.db_name)
-            cursor.execute(
-                "SELECT pg_terminate_backend(pg_stat_activity.pid) "
-                " FROM pg_stat_activity "
-                " WHERE pg_stat_activity.datname = '{}'"
-                " AND pid <> pg_backend_pid() ".format(self.db_name)
-            )
-            cursor.execute('DROP DATABASE ' + self.db_name)
+            disconnect_sessions(cursor, db_name)
+            cursor.execute('DROP DATABASE ' + db_name)
         finally:
             cursor.close()
 
@@ -125,37 +275,53 @@ class OpenERPService(object):
 
         :param module: Module to install
         """
-        logger.info('Installing module %s', module)
+        self.install_modules([module], with_test_depends=with_test_depends)
+
+    def install_modules(self, modules, with_test_depends=False):
+        """Installs a list of modules in a single pool restart
+
+        :param modules: Modules to install
+        """
+        logger.info('Installing modules %s', ', '.join(modules))
         import pooler
         from destral.transaction import Transaction
         module_obj = self.pool.get('ir.module.module')
         with Transaction().start(self.config['db_name']) as txn:
             cursor = txn.cursor
             uid = txn.user
-            module_ids = module_obj.search(cursor, uid, [
-                ('name', '=', module),
+            installed_ids = module_obj.search(cursor, uid, [
+                ('name', 'in', modules),
                 ('state', '=', 'installed')
             ])
-            if not module_ids:
-                module_obj.update_list(cursor, uid)
-                module_ids = module_obj.search(
-                    txn.cursor, DEFAULT_USER,
-                    [('name', '=', module)],
+            installed = [
+                m['name'] for m in module_obj.read(
+                    cursor, uid, installed_ids, ['name']
                 )
-                assert module_ids, "Module %s not found" % module
-                module_info = module_obj.get_module_info(module)
-                if with_test_depends and module_info.get('test_depends'):
-                    logger.info("Found extra dependencies for module %s" % module)
-                    extra_modules = module_info['test_depends']
-                    logger.info("Including extra dependencies:\n%s" % '\n'.join(extra_modules))
-                    extra_modules_ids = module_obj.search(
+            ]
+            to_install = [m for m in modules if m not in installed]
+            if to_install:
+                module_obj.update_list(cursor, uid)
+                module_ids = []
+                for module in to_install:
+                    ids = module_obj.search(
                         txn.cursor, DEFAULT_USER,
-                        [('name', 'in', extra_modules), ('state', '!=', 'installed')],
+                        [('name', '=', module)],
                     )
-                    if len(extra_modules_ids) != len(extra_modules):
-                        logger.warning("Some extra dependencies were not found or already installed")
+                    assert ids, "Module %s not found" % module
+                    module_ids.extend(ids)
+                    module_info = module_obj.get_module_info(module)
+                    if with_test_depends and module_info.get('test_depends'):
+                        logger.info("Found extra dependencies for module %s" % module)
+                        extra_modules = module_info['test_depends']
+                        logger.info("Including extra dependencies:\n%s" % '\n'.join(extra_modules))
+                        extra_modules_ids = module_obj.search(
+                            txn.cursor, DEFAULT_USER,
+                            [('name', 'in', extra_modules), ('state', '!=', 'installed')],
+                        )
+                        if len(extra_modules_ids) != len(extra_modules):
+                            logger.warning("Some extra dependencies were not found or already installed")
 
-                    module_ids.extend(extra_modules_ids)
+                        module_ids.extend(extra_modules_ids)
 
                 module_obj.button_install(cursor, uid, module_ids)
                 pool = pooler.get_pool(cursor.dbname)
@@ -181,6 +347,8 @@ class OpenERPService(object):
         except Exception:
             self.shutdown(1)
             raise
+        finally:
+            Transaction.clear_context_cache(self.config['db_name'])
 
     def enable_admin(self, password='admin'):
         from destral.transaction import Transaction
@@ -0,0 +1,144 @@
+# coding=utf-8
+import atexit
+import getpass
+import logging
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+
+logger = logging.getLogger('destral.pgcluster')
+
+SERVER_SETTINGS = (
+    ('fsync', 'off'),
+    ('synchronous_commit', 'off'),
+    ('full_page_writes', 'off'),
+    ('wal_level', 'minimal'),
+    ('max_wal_senders', '0'),
+    ('checkpoint_timeout', '1h'),
+    ('autovacuum', 'off'),
+)
+"""Settings of the ephemeral cluster, trading durability for speed
+"""
+
+SHM_DIR = '/dev/shm'
+"""tmpfs directory used for the cluster when available
+"""
+
+
+def find_free_port(host='127.0.0.1'):
+    """A TCP port free in `host`.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+    finally:
+        sock.close()
+
+
+def find_pg_binary(name):
+    """Path of a PostgreSQL server binary.
+
+    Looks in the `PATH` and in the `pg_config --bindir` directory.
+
+    :param name: Binary name (`initdb`, `pg_ctl`)
+    :raises RuntimeError: if the binary can not be found
+    """
+    paths = os.environ.get('PATH', '').split(os.pathsep)
+    try:
+        bindir = subprocess.check_output(['pg_config', '--bindir'])
+        paths.append(bindir.decode('utf-8').strip())
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    for path in paths:
+        binary = os.path.join(path, name)
+        if os.path.isfile(binary) and os.access(binary, os.X_OK):
+            return binary
+    raise RuntimeError('PostgreSQL {} not found'.format(name))
+
+
+class EphemeralCluster(object):
+    """Throwaway PostgreSQL cluster for a destral run.
+
+    The cluster lives in tmpfs (`/dev/shm`, or the temporary directory when
+    it is not available) with durability turned off, listens on a free port
+    of localhost and is removed when stopped or when the process exits.
+    PostgreSQL refuses to run as root, so run destral with another user.
+
+    :param user: Superuser of the cluster (the current user by default)
+    """
+
+    def __init__(self, user=None):
+        self.user = user or getpass.getuser()
+        self.host = '127.0.0.1'
+        self.port = None
+        self.base_dir = None
+
+    @property
+    def data_dir(self):
+        return os.path.join(self.base_dir, 'data')
+
+    def server_options(self):
+        """Options of the postgres server.
+        """
+        options = [
+            ('listen_addresses', self.host),
+            ('port', str(self.port)),
+            ('unix_socket_directories', self.base_dir),
+        ]
+        options.extend(SERVER_SETTINGS)
+        return ' '.join(
+            "-c {}='{}'".format(key, value) for key, value in options
+        )
+
+    def start(self):
+        """Create and start the cluster.
+
+        :return: the environment variables pointing OpenERPService to it
+        """
+        parent = SHM_DIR if os.access(SHM_DIR, os.W_OK) else None
+        self.base_dir = tempfile.mkdtemp(prefix='destral_pg_', dir=parent)
+        atexit.register(self.stop)
+        logger.info('Creating PostgreSQL cluster in %s', self.base_dir)
+        with open(os.devnull, 'w') as devnull:
+            subprocess.check_call([
+                find_pg_binary('initdb'), '-D', self.data_dir, '-U', self.user,
+                '-A', 'trust', '-E', 'UTF8', '--no-sync'
+            ], stdout=devnull)
+        self.port = find_free_port(self.host)
+        subprocess.check_call([
+            find_pg_binary('pg_ctl'), 'start', '-w', '-D', self.data_dir,
+            '-l', os.path.join(self.base_dir, 'postgresql.log'),
+            '-o', self.server_options()
+        ])
+        logger.info('PostgreSQL cluster listening on %s:%s', self.host,
+                    self.port)
+        return self.environ()
+
+    def environ(self):
+        """Environment variables to connect OpenERPService to the cluster.
+        """
+        return {
+            'OPENERP_DB_HOST': self.host,
+            'OPENERP_DB_PORT': str(self.port),
+            'OPENERP_DB_USER': self.user,
+        }
+
+    def stop(self):
+        """Stop the cluster and remove its files.
+        """
+        if self.base_dir is None:
+            return
+        if os.path.exists(os.path.join(self.data_dir, 'postmaster.pid')):
+            logger.info('Stopping PostgreSQL cluster %s', self.base_dir)
+            try:
+                subprocess.check_call([
+                    find_pg_binary('pg_ctl'), 'stop', '-D', self.data_dir,
+                    '-m', 'immediate'
+                ])
+            except (OSError, RuntimeError, subprocess.CalledProcessError):
+                logger.exception('Error stopping the PostgreSQL cluster')
+        shutil.rmtree(self.base_dir, ignore_errors=True)
+        self.base_dir = None
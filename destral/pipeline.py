@@ -0,0 +1,123 @@
+# coding=utf-8
+import logging
+import multiprocessing
+import os
+import time
+
+logger = logging.getLogger('destral.pipeline')
+
+
+def prepare_database(module, tests=None):
+    """Create a database with a module installed, in a pipeline worker.
+
+    The demo data is loaded if the first tests to run need it (see
+    :meth:`destral.testing.OOTestSuite.demo_groups`).
+
+    :param module: Module to test
+    :param tests: Names of the tests that will run (all by default)
+    :return: a tuple with the database name, the timings of its creation
+        and the module install and if it has demo data
+    """
+    from destral.forkserver import forget_inherited_connections
+    from destral.testing import create_module_database, demo_config
+    from destral.testing import get_unittest_suite
+    from destral.utils import update_config
+    import sql_db
+    forget_inherited_connections()
+    os.environ['DESTRAL_MODULE'] = module
+    suite = get_unittest_suite(module, tests)
+    groups = suite.demo_groups()
+    demo = groups[0][0] if groups else False
+    openerp = suite.openerp
+    update_config(openerp.config, **demo_config(demo))
+    timings = {}
+    start = time.time()
+    db_name = create_module_database(openerp, suite.config, demo)
+    timings['create_database'] = time.time() - start
+    try:
+        openerp.db_name = db_name
+        start = time.time()
+        openerp.install_module(module, with_test_depends=True)
+        timings['install'] = time.time() - start
+    except Exception:
+        openerp.db_name = False
+        openerp.drop_database(db_name)
+        raise
+    openerp.db_name = False
+    sql_db.close_db(db_name)
+    logger.info('Database %s prepared for module %s', db_name, module)
+    return db_name, timings, demo
+
+
+def drop_database(db_name):
+    """Drop a database, in a pipeline worker.
+    """
+    from destral.forkserver import forget_inherited_connections
+    from destral.openerp import OpenERPService
+    forget_inherited_connections()
+    try:
+        OpenERPService().drop_database(db_name)
+    except Exception:
+        logger.exception('Error dropping database %s', db_name)
+
+
+class DatabasePipeline(object):
+    """Prepare the databases of the next modules while a module is tested.
+
+    A single worker process creates the database of a module and installs
+    it, and drops the databases of the modules already tested. The
+    preparations and drops run in order, so the drop of a module overlaps
+    with the tests of the next one. Like :func:`destral.scheduler.run_in_pool`
+    every task gets a new worker, so the registries and patches of a module
+    do not leak into the next one. The workers are forked from the parent
+    during the run, so they never use the database connections inherited
+    from it (see :func:`destral.forkserver.forget_inherited_connections`).
+    """
+
+    def __init__(self):
+        self.pool = multiprocessing.Pool(processes=1, maxtasksperchild=1)
+        self.pending = {}
+
+    def prepare(self, module, tests=None):
+        """Start preparing the database of a module.
+
+        :param module: Module to test
+        :param tests: Names of the tests that will run (all by default), to
+            load the demo data only if they need it
+        """
+        if module == 'base' or module in self.pending:
+            # base is updated, not installed
+            return
+        self.pending[module] = self.pool.apply_async(
+            prepare_database, (module, tests)
+        )
+
+    def get(self, module):
+        """Wait for the database of a module.
+
+        :return: a tuple with the database name (None if it could not be
+            prepared), the timings and if it has demo data
+        """
+        pending = self.pending.pop(module, None)
+        if pending is None:
+            return None, {}, False
+        try:
+            return pending.get()
+        except Exception:
+            logger.exception('Error preparing the database of %s', module)
+            return None, {}, False
+
+    def drop(self, db_name):
+        """Drop a database in the background.
+        """
+        self.pool.apply_async(drop_database, (db_name,))
+
+    def close(self):
+        """Drop the databases prepared and not used and wait for the worker.
+        """
+        for module in list(self.pending):
+            db_name, _, _ = self.get(module)
+            if db_name:
+                self.drop(db_name)
+        self.pool.close()
+        self.pool.join()
@@ -0,0 +1,127 @@
+# coding=utf-8
+import logging
+import multiprocessing
+
+logger = logging.getLogger('destral.scheduler')
+
+
+def run_in_pool(func, items, jobs, after=None):
+    """Run `func` for every item in a pool of worker processes.
+
+    Every item runs in a fresh process (`maxtasksperchild=1`) so the OpenERP
+    state of one module never leaks into the next one. Items are dispatched
+    in order, but an item waits until the items it comes `after` are done
+    (dependencies caught in a cycle are ignored).
+
+    :param func: Picklable callable receiving one item
+    :param items: Items to dispatch, in order
+    :param jobs: Number of worker processes
+    :param after: List with, for every item, the indexes of the items that
+        have to finish before it starts
+    :return: A list with the results in the same order as `items`
+    """
+    items = list(items)
+    if not items:
+        return []
+    jobs = max(1, min(jobs, len(items)))
+    logger.info('Running %s tasks with %s workers', len(items), jobs)
+    if after is None:
+        after = [()] * len(items)
+    waiting = dict(
+        (index, set(after[index]) - set([index]))
+        for index in range(len(items))
+    )
+    running = {}
+    results = {}
+    pool = multiprocessing.Pool(processes=jobs, maxtasksperchild=1)
+    try:
+        while waiting or running:
+            ready = [i for i in sorted(waiting) if not waiting[i]]
+            if not ready and not running:
+                # Dependency cycle, start the first waiting item
+                ready = [min(waiting)]
+                logger.warning('Ignoring the dependencies of task %s',
+                               ready[0])
+            for index in ready[:jobs - len(running)]:
+                del waiting[index]
+                running[index] = pool.apply_async(func, (items[index],))
+            done = [i for i, result in running.items() if result.ready()]
+            if not done:
+                running[min(running)].wait(0.1)
+                continue
+            for index in done:
+                results[index] = running.pop(index).get()
+                for pending in waiting.values():
+                    pending.discard(index)
+        return [results[index] for index in range(len(items))]
+    finally:
+        pool.close()
+        pool.join()
+
+
+def parse_shard(value):
+    """Parse a shard selector.
+
+    :param value: String with the format `i/N` (`i` starts at 1)
+    :return: a tuple with the shard index (from 1) and the number of shards
+    :raises ValueError: if the value is not a valid selector
+    """
+    try:
+        index, total = [int(x) for x in value.split('/')]
+    except (AttributeError, ValueError):
+        raise ValueError('Shard must be like 1/4, got {}'.format(value))
+    if total < 1 or not 1 <= index <= total:
+        raise ValueError('Shard {} out of range'.format(value))
+    return index, total
+
+
+def shard_modules(modules, shards, estimate, default=None):
+    """Split modules into shards with a similar estimated duration.
+
+    Longest processing time first: modules are assigned from the longest to
+    the shortest to the least loaded shard. Ties are broken by name and
+    shard number, so the split only depends on the modules and their
+    estimates (without estimates, it is a round robin of the sorted names).
+    Inside a shard the modules keep their order in `modules` (the dependency
+    order).
+
+    :param modules: Modules sorted by dependencies
+    :param shards: Number of shards
+    :param estimate: Callable returning the estimated duration of a module
+        or None when unknown
+    :param default: Duration of modules without estimate (the mean of the
+        known ones by default)
+    :return: a list with the modules of every shard and a list with the
+        estimated duration of every shard
+    """
+    estimates = dict((m, estimate(m)) for m in modules)
+    if default is None:
+        known = [e for e in estimates.values() if e is not None]
+        default = sum(known) / len(known) if known else 1
+    for module, value in estimates.items():
+        if value is None:
+            estimates[module] = default
+    loads = [0] * shards
+    assigned = [[] for _ in range(shards)]
+    for module in sorted(modules, key=lambda m: (-estimates[m], m)):
+        shard = min(range(shards), key=lambda s: (loads[s], s))
+        loads[shard] += estimates[module]
+        assigned[shard].append(module)
+    position = dict((m, i) for i, m in enumerate(modules))
+    return [sorted(s, key=position.get) for s in assigned], loads
+
+
+def split_modules(modules, shards, durations=None):
+    """Split modules into shards the same way in every CI node.
+
+    :param modules: Modules sorted by dependencies
+    :param shards: Number of shards
+    :param durations: Dictionary with the module durations shared by all
+        the nodes (see :func:`destral.history.load_durations`) or None to
+        split them by name. Never use the local history of a node: each node
+        only records the modules of its shard.
+    :return: a list with the modules of every shard and a list with the
+        estimated duration of every shard
+    """
+    durations = durations or {}
+    return shard_modules(modules, shards, durations.get)
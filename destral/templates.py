@@ -0,0 +1,301 @@
+# coding=utf-8
+import errno
+import hashlib
+import logging
+import os
+import re
+import time
+from contextlib import contextmanager
+
+from destral.openerp import disconnect_sessions
+from destral.utils import get_dependencies, get_manifest
+
+logger = logging.getLogger('destral.templates')
+
+TEMPLATE_PREFIX = 'destral_tpl_'
+"""Prefix of the cached template databases
+"""
+
+KEY_LENGTH = 32
+"""Length of the key in the template names
+"""
+
+BUILD_NAME_RE = re.compile(
+    r'^' + TEMPLATE_PREFIX + r'[0-9a-f]{%d}_(\d+)$' % KEY_LENGTH
+)
+"""Names of the templates being built, capturing the pid of the builder
+"""
+
+EVICT_GRACE = 600
+"""Seconds since their last use during which templates are never evicted
+"""
+
+MANIFEST_DATA_KEYS = ('init_xml', 'update_xml', 'demo_xml', 'data', 'demo')
+"""Manifest keys listing the data files loaded on install
+"""
+
+
+def pid_alive(pid):
+    """Is a process of this host running?
+    """
+    try:
+        os.kill(pid, 0)
+    except OSError as e:
+        return e.errno == errno.EPERM
+    return True
+
+
+def template_modules(module, addons_path):
+    """Modules to preinstall in the template database of a module.
+
+    Installing the direct and test dependencies pulls the whole chain.
+
+    :param module: Module to test
+    :param addons_path: Path to find the modules
+    :return: a list of modules
+    """
+    manifest = get_manifest(module, addons_path)
+    modules = list(manifest.get('depends', []))
+    for dep in manifest.get('test_depends', []):
+        if dep not in modules:
+            modules.append(dep)
+    return modules
+
+
+def module_files(module, addons_path):
+    """Files of a module that define the state of an installed database.
+
+    :param module: Module name
+    :param addons_path: Path to find the modules
+    :return: a sorted list of paths relative to `addons_path`
+    """
+    module_path = os.path.join(addons_path, module)
+    manifest = get_manifest(module, addons_path)
+    files = set([os.path.join(module, '__terp__.py')])
+    for key in MANIFEST_DATA_KEYS:
+        for data_file in manifest.get(key, []):
+            files.add(os.path.join(module, data_file))
+    for root, dirs, filenames in os.walk(module_path):
+        for filename in filenames:
+            if filename.endswith('.py'):
+                files.add(os.path.relpath(
+                    os.path.join(root, filename), addons_path
+                ))
+    return sorted(files)
+
+
+def template_key(module, addons_path, demo=True):
+    """Hash identifying the template database of a module.
+
+    It covers the resolved dependency set, the contents of the manifest,
+    data and python files of every module in it and if demo data is loaded.
+
+    :param module: Module to test
+    :param addons_path: Path to find the modules
+    :param demo: Are the modules installed with demo data?
+    :return: an hexadecimal digest
+    """
+    deps = set()
+    for dep in template_modules(module, addons_path):
+        deps.add(dep)
+        deps.update(get_dependencies(dep, addons_path))
+    digest = hashlib.sha1()
+    if not demo:
+        digest.update(b'without_demo')
+    for dep in sorted(deps):
+        for path in module_files(dep, addons_path):
+            digest.update(path.encode('utf-8'))
+            full_path = os.path.join(addons_path, path)
+            if os.path.isfile(full_path):
+                with open(full_path, 'rb') as data_file:
+                    digest.update(data_file.read())
+    return digest.hexdigest()
+
+
+class DatabaseTemplateCache(object):
+    """Cache of template databases with the dependencies of a module installed.
+
+    Templates live in the PostgreSQL cluster named `destral_tpl_<key>`. The
+    last time a template was used is stored as the database comment and the
+    least recently used ones are dropped when there are more than
+    `max_templates`, unless they were used in the last `EVICT_GRACE`
+    seconds or another worker is copying them.
+
+    :param service: OpenERPService used to build the templates
+    :param max_templates: Maximum number of templates to keep
+    """
+
+    def __init__(self, service, max_templates=5):
+        self.service = service
+        self.max_templates = max_templates
+
+    def get_template(self, module, demo=True):
+        """Get the template database for a module, building it if needed.
+
+        The modules are installed with the demo data setting of the service,
+        which must match `demo`.
+
+        :param module: Module to test
+        :param demo: Are the modules installed with demo data?
+        :return: the template database name or None if the module has no
+            dependencies
+        """
+        addons_path = self.service.config['addons_path']
+        modules = template_modules(module, addons_path)
+        if not modules:
+            return None
+        name = TEMPLATE_PREFIX + template_key(
+            module, addons_path, demo
+        )[:KEY_LENGTH]
+        if name in self.list_templates():
+            logger.info('Using template %s for module %s', name, module)
+        else:
+            self.build(name, modules)
+        self.touch(name)
+        self.evict(keep=name)
+        return name
+
+    def build(self, name, modules):
+        """Build a template database with `modules` installed.
+
+        The database is built under a temporary name and renamed at the end,
+        so a half-built template is never used.
+
+        :param name: Template database name
+        :param modules: Modules to install
+        """
+        import psycopg2
+        import sql_db
+        logger.info('Building template %s with %s', name, ', '.join(modules))
+        build_name = '{}_{}'.format(name, os.getpid())
+        self.service.create_database(False, db_name=build_name)
+        try:
+            self.service.db_name = build_name
+            self.service.install_modules(modules)
+        except Exception:
+            self.service.db_name = False
+            self._drop(build_name)
+            raise
+        self.service.db_name = False
+        sql_db.close_db(build_name)
+        with self._cursor() as cursor:
+            disconnect_sessions(cursor, build_name)
+            try:
+                cursor.execute('ALTER DATABASE {} RENAME TO {}'.format(
+                    build_name, name
+                ))
+            except psycopg2.Error:
+                # Built by another worker meanwhile
+                logger.info('Template %s already exists', name)
+                cursor.execute('DROP DATABASE {}'.format(build_name))
+
+    def list_templates(self):
+        """List the cached templates.
+
+        :return: a dictionary with the template names and its last use
+        """
+        templates = {}
+        with self._cursor() as cursor:
+            cursor.execute(
+                "SELECT d.datname, shobj_description(d.oid, 'pg_database') "
+                " FROM pg_database d "
+                " WHERE d.datname LIKE %s", (TEMPLATE_PREFIX + '%',)
+            )
+            for name, last_used in cursor.fetchall():
+                if len(name) != len(TEMPLATE_PREFIX) + KEY_LENGTH:
+                    # Template still being built
+                    continue
+                try:
+                    templates[name] = float(last_used)
+                except (TypeError, ValueError):
+                    templates[name] = 0
+        return templates
+
+    def list_builds(self):
+        """List the templates being built or left by crashed builds.
+
+        :return: a dictionary with the build database names and the number
+            of sessions connected to them
+        """
+        builds = {}
+        with self._cursor() as cursor:
+            cursor.execute(
+                "SELECT d.datname, count(a.pid) "
+                " FROM pg_database d "
+                " LEFT JOIN pg_stat_activity a ON a.datname = d.datname "
+                " WHERE d.datname LIKE %s "
+                " GROUP BY d.datname", (TEMPLATE_PREFIX + '%',)
+            )
+            for name, sessions in cursor.fetchall():
+                if BUILD_NAME_RE.match(name):
+                    builds[name] = sessions
+        return builds
+
+    def cleanup_builds(self):
+        """Drop the templates left by crashed builds.
+
+        A build is left over when nobody is connected to it and its builder
+        process (of this host) is not running.
+
+        :return: a list with the dropped build databases
+        """
+        dropped = []
+        for name, sessions in self.list_builds().items():
+            pid = int(BUILD_NAME_RE.match(name).group(1))
+            if sessions or pid_alive(pid):
+                continue
+            logger.info('Dropping template build leftover %s', name)
+            self._drop(name)
+            dropped.append(name)
+        return dropped
+
+    def touch(self, name):
+        """Mark a template as used now.
+        """
+        with self._cursor() as cursor:
+            cursor.execute("COMMENT ON DATABASE {} IS '{}'".format(
+                name, time.time()
+            ))
+
+    def evict(self, keep=None):
+        """Drop the least recently used templates over `max_templates`.
+
+        The sessions of the templates are not terminated, so a template
+        another worker is copying is kept.
+
+        :param keep: Template that must not be dropped
+        :return: a list with the evicted templates
+        """
+        import psycopg2
+        self.cleanup_builds()
+        templates = self.list_templates()
+        by_use = sorted(templates, key=lambda t: templates[t], reverse=True)
+        evicted = []
+        for name in by_use[self.max_templates:]:
+            if name == keep or time.time() - templates[name] < EVICT_GRACE:
+                continue
+            logger.info('Evicting template %s', name)
+            try:
+                self._drop(name, disconnect=False)
+            except psycopg2.Error as e:
+                logger.info('Template %s in use, not evicted: %s', name, e)
+            else:
+                evicted.append(name)
+        return evicted
+
+    def _drop(self, name, disconnect=True):
+        with self._cursor() as cursor:
+            if disconnect:
+                disconnect_sessions(cursor, name)
+            cursor.execute('DROP DATABASE IF EXISTS {}'.format(name))
+
+    @contextmanager
+    def _cursor(self):
+        import sql_db
+        cursor = sql_db.db_connect('postgres').cursor()
+        try:
+            cursor.autocommit(True)
+            yield cursor
+        finally:
+            cursor.close()
+            sql_db.close_db('postgres')
@@ -1,15 +1,19 @@
 import importlib
 import logging
 import os
+import time
 import unittest
 import sys
+import zlib
 
 from destral.junitxml_testing import JUnitXMLResult, LoggerStream
 from destral.junitxml_testing import JUnitXMLApplicationFactory
 from destral.junitxml_testing import JUnitXMLMambaFormatter
 from destral.openerp import OpenERPService
+from destral.impact import coverage_test_context
+from destral.templates import DatabaseTemplateCache
 from destral.transaction import Transaction
-from destral.utils import module_exists
+from destral.utils import module_exists, update_config, ManifestIndex
 from osconf import config_from_environment
 from ctx import _ws_info
 from tools.service_utils import WebServiceTracker
@@ -17,6 +21,44 @@ from tools.service_utils import WebServiceTracker
 
 logger = logging.getLogger('destral.testing')
 
+TEST_SAVEPOINT = 'destral_test'
+"""Savepoint wrapping every test of `OOTestCaseWithCursor.use_savepoints`
+"""
+
+
+def demo_config(demo):
+    """OpenERP configuration to install modules with or without demo data.
+    """
+    if demo:
+        return {'demo': {'all': 1}, 'without_demo': False}
+    return {'demo': {}, 'without_demo': True}
+
+
+def module_service_config(module, demo=True):
+    """Configuration of the OpenERPService testing a module.
+    """
+    ooconfig = demo_config(demo)
+    if module == 'base':
+        ooconfig['update'] = {'base': 1}
+    return ooconfig
+
+
+def create_module_database(openerp, config, demo=True):
+    """Create the database to test a module.
+
+    :param openerp: OpenERPService
+    :param config: Suite config with `module`, `use_template`,
+        `template_cache` and `max_templates`
+    :param demo: Will the module be installed with demo data?
+    :return: the database name
+    """
+    template = config['use_template']
+    if config['template_cache']:
+        template = DatabaseTemplateCache(
+            openerp, config['max_templates']
+        ).get_template(config['module'], demo=demo) or template
+    return openerp.create_database(template)
+
 
 class OOTestSuite(unittest.TestSuite):
 
@@ -24,34 +66,79 @@ class OOTestSuite(unittest.TestSuite):
         super(OOTestSuite, self).__init__(tests)
         self.config = config_from_environment(
             'DESTRAL', ['module', 'testing_langs'],
-            use_template=True, testing_langs=[]
+            use_template=True, testing_langs=[], template_cache=False,
+            max_templates=5, always_demo=False
         )
-        ooconfig = {}
         self.config['use_template'] = False
-        ooconfig['demo'] = {'all': 1}
-        if self.config['module'] == 'base':
-            ooconfig.setdefault('update', {})
-            ooconfig['update'].update({'base': 1})
-        self.openerp = OpenERPService(**ooconfig)
+        self.openerp = OpenERPService(
+            **module_service_config(self.config['module'])
+        )
         self.drop_database = True
+        """Database with the module already installed to use"""
+        self.prepared_database = None
+        """Was the prepared database installed with demo data?"""
+        self.prepared_demo = False
+        """Callable receiving the name of the database to drop it instead of
+        dropping it synchronously"""
+        self.database_dropper = None
+        self.timings = {}
+
+    def demo_groups(self):
+        """Split the tests by the demo data they require.
+
+        Tests of classes with `require_demo_data` need demo data, the rest
+        can run without it (all of them need it with `DESTRAL_ALWAYS_DEMO`).
+
+        :return: a list of tuples with the demo flag and its tests, the ones
+            without demo data first
+        """
+        tests = list(iter_suite_tests(self))
+        if self.config['always_demo']:
+            return [(True, tests)] if tests else []
+        lean = [t for t in tests if not getattr(t, 'require_demo_data', False)]
+        demo = [t for t in tests if getattr(t, 'require_demo_data', False)]
+        return [(d, group) for d, group in ((False, lean), (True, demo))
+                if group]
 
     def run(self, result, debug=False):
         """Run the test suite
 
         * Sets the config using environment variables prefixed with `DESTRAL_`.
         * Creates a new OpenERP service.
-        * Installs the module to test if a database is not defined.
+        * Installs the module to test if a database is not defined, with demo
+          data only if a test requires it. When only some tests require it,
+          they run in a different database.
         """
         module_suite = not result._testRunEntered
         if module_suite:
+            groups = self.demo_groups()
+            if len(groups) > 1 and not self.openerp.db_name:
+                return self._run_demo_groups(groups, result, debug)
+            demo = any(d for d, _ in groups)
+            update_config(self.openerp.config, **demo_config(demo))
+            if self.prepared_database and self.prepared_demo != demo:
+                self._discard_prepared_database()
+            prepared = False
             if not self.openerp.db_name:
-                self.openerp.db_name = self.openerp.create_database(
-                    self.config['use_template']
-                )
+                if self.prepared_database:
+                    logger.info(
+                        'Using prepared database %s', self.prepared_database
+                    )
+                    self.openerp.db_name = self.prepared_database
+                    prepared = True
+                else:
+                    start = time.time()
+                    self.openerp.db_name = create_module_database(
+                        self.openerp, self.config, demo
+                    )
+                    self.timings['create_database'] = time.time() - start
             else:
                 self.drop_database = False
             result.db_name = self.openerp.db_name
-            self.openerp.install_module(self.config['module'], with_test_depends=True)
+            if not prepared:
+                start = time.time()
+                self.openerp.install_module(self.config['module'], with_test_depends=True)
+                self.timings['install'] = time.time() - start
         else:
             self.openerp.db_name = result.db_name
 
@@ -60,13 +147,56 @@ class OOTestSuite(unittest.TestSuite):
         module_suite = not result._testRunEntered
         if module_suite:
             if self.drop_database:
-                self.openerp.drop_database()
+                start = time.time()
+                if self.database_dropper is not None:
+                    import sql_db
+                    sql_db.close_db(self.openerp.db_name)
+                    self.database_dropper(self.openerp.db_name)
+                else:
+                    self.openerp.drop_database()
+                self.timings['drop_database'] = time.time() - start
                 self.openerp.db_name = False
             else:
                 logger.info('Not dropping database %s', self.openerp.db_name)
                 self.openerp.enable_admin()
         return res
 
+    def _run_demo_groups(self, groups, result, debug):
+        """Run every group of tests in its own database.
+        """
+        logger.info(
+            'Running %s tests without demo data and %s with demo data',
+            len(groups[0][1]), len(groups[1][1])
+        )
+        for demo, tests in groups:
+            suite = OOTestSuite(tests)
+            suite.config = self.config
+            suite.drop_database = self.drop_database
+            suite.database_dropper = self.database_dropper
+            if self.prepared_database and self.prepared_demo == demo:
+                suite.prepared_database = self.prepared_database
+                suite.prepared_demo = demo
+                self.prepared_database = None
+            # The classes of the previous group are already torn down
+            result._previousTestClass = None
+            suite.run(result, debug)
+            for key, value in suite.timings.items():
+                self.timings[key] = self.timings.get(key, 0) + value
+        if self.prepared_database:
+            self._discard_prepared_database()
+        return result
+
+    def _discard_prepared_database(self):
+        logger.info(
+            'Prepared database %s has not the demo data required',
+            self.prepared_database
+        )
+        if self.database_dropper is not None:
+            self.database_dropper(self.prepared_database)
+        else:
+            self.openerp.drop_database(self.prepared_database)
+        self.prepared_database = None
+
     def _handleClassSetUp(self, test, result):
         test_class = test.__class__
         test_class.openerp = self.openerp
@@ -113,22 +243,82 @@ class OOTestCase(unittest.TestCase):
 
 
 class OOTestCaseWithCursor(OOTestCase):
+    """Test case with a transaction started for every test and rolled back
+    when it ends.
+
+    With `use_savepoints` a single transaction is started for the whole class
+    and every test runs inside a savepoint, rolled back when the test ends.
+    Tests of these classes must not start new transactions nor commit or
+    roll back: such a test fails and the next tests of the class run in a
+    new transaction, without the data created in `setUpClass`.
+    """
+
+    """Share one transaction per class and isolate the tests with savepoints?"""
+    use_savepoints = False
+
+    class_txn = None
+
+    @classmethod
+    def setUpClass(cls):
+        super(OOTestCaseWithCursor, cls).setUpClass()
+        if cls.use_savepoints:
+            cls.class_txn = Transaction().start(cls.openerp.db_name)
+
+    @classmethod
+    def tearDownClass(cls):
+        if cls.class_txn is not None:
+            cls.class_txn.stop()
+            cls.class_txn = None
+        super(OOTestCaseWithCursor, cls).tearDownClass()
 
     def setUp(self):
-        self.txn = Transaction().start(self.database)
+        if self.class_txn is not None:
+            self.txn = self.class_txn
+            self.txn.cursor.execute('SAVEPOINT {}'.format(TEST_SAVEPOINT))
+        else:
+            self.txn = Transaction().start(self.database)
         self.cursor = self.txn.cursor
         self.uid = self.txn.user
         _ws_info.push(WebServiceTracker(uid=self.uid))
 
     def tearDown(self):
-        self.txn.stop()
-        _ws_info.pop()
+        try:
+            if self.class_txn is not None:
+                self._rollback_test_savepoint()
+            else:
+                self.txn.stop()
+        finally:
+            _ws_info.pop()
+
+    def _rollback_test_savepoint(self):
+        try:
+            # Release it too, so savepoints don't pile up in the class
+            self.txn.cursor.execute(
+                'ROLLBACK TO SAVEPOINT {0}; RELEASE SAVEPOINT {0}'.format(
+                    TEST_SAVEPOINT
+                )
+            )
+        except Exception:
+            # The test committed or rolled back the class transaction. What
+            # it committed can not be undone, so the test fails and the next
+            # tests of the class run in a new transaction
+            cls = type(self)
+            cls.class_txn.stop()
+            cls.class_txn = Transaction().start(cls.openerp.db_name)
+            self.fail(
+                'Savepoint lost in {}: tests using savepoints must not commit '
+                'or roll back the transaction, the class data may be '
+                'committed'.format(self.id())
+            )
 
 
 class OOBaseTests(OOTestCase):
 
     def test_all_views(self):
         """Tests all views defined in the module.
+
+        Views are read in bulk and every view of an inheritance tree is
+        validated once per version, even if it is the parent of many views.
         """
         try:
             from tools import TestingExceptions
@@ -138,7 +328,10 @@ class OOBaseTests(OOTestCase):
         logger.info('Testing views for module %s', self.config['module'])
         imd_obj = self.openerp.pool.get('ir.model.data')
         view_obj = self.openerp.pool.get('ir.ui.view')
+        view_fields = ['name', 'model', 'type', 'version', 'inherit_id']
         with Transaction().start(self.database) as txn:
+            cursor = txn.cursor
+            uid = txn.user
             search_params = [
                 ('model', '=', 'ir.ui.view')
             ]
@@ -146,53 +339,97 @@ class OOBaseTests(OOTestCase):
                 search_params += [
                     ('module', '=', self.config['module'])
                 ]
-            imd_ids = imd_obj.search(txn.cursor, txn.user, search_params)
-            if imd_ids:
-                views = {}
-                for imd in imd_obj.read(txn.cursor, txn.user, imd_ids):
-                    view_xml_name = '{}.{}'.format(imd['module'], imd['name'])
-                    views[imd['res_id']] = view_xml_name
-                view_ids = views.keys()
-                logger.info('Testing %s views...', len(view_ids))
-                for view in view_obj.browse(txn.cursor, txn.user, view_ids):
-                    view_xml_name = views[view.id]
-                    model = self.openerp.pool.get(view.model)
-                    if model is None:
-                        # Check if model exists
-                        raise Exception(
-                            'View (xml id: %s) references model %s which does '
-                            'not exist' % (view_xml_name, view.model)
+            imd_ids = imd_obj.search(cursor, uid, search_params)
+            if not imd_ids:
+                return
+            views = {}
+            for imd in imd_obj.read(cursor, uid, imd_ids, ['module', 'name', 'res_id']):
+                view_xml_name = '{}.{}'.format(imd['module'], imd['name'])
+                views[imd['res_id']] = view_xml_name
+            view_ids = list(views.keys())
+            logger.info('Testing %s views...', len(view_ids))
+            # Prefetch the views and all their parents
+            records = {}
+            to_read = set(view_ids)
+            requested = set()
+            while to_read:
+                requested |= to_read
+                for record in view_obj.read(cursor, uid, list(to_read), view_fields):
+                    records[record['id']] = record
+                to_read = set(
+                    r['inherit_id'][0] for r in records.values()
+                    if r['inherit_id'] and r['inherit_id'][0] not in requested
+                )
+
+            # (view id[, version]) => True if validated, False if skipped
+            validated = {}
+            timings = []
+
+            def validate(model, view, *version):
+                key = (view['id'],) + version
+                if key not in validated:
+                    kwargs = {'version': version[0]} if version else {}
+                    start = time.time()
+                    try:
+                        model.fields_view_get(
+                            cursor, uid, view['id'], view['type'], **kwargs
                         )
-                    logger.info('Testing view %s (id: %s) v%s', view.name, view.id, view.version)
-                    if SkipViewValidation:
-                        try:
-                            model.fields_view_get(txn.cursor, txn.user, view.id, view.type, version=view.version)
-                        except TestingExceptions.SkipViewValidation:
+                        validated[key] = True
+                    except Exception as e:
+                        if SkipViewValidation and isinstance(e, SkipViewValidation):
+                            validated[key] = False
+                        raise
+                    finally:
+                        timings.append((time.time() - start, view['id']))
+                return validated[key]
+
+            for view_id in view_ids:
+                view = records[view_id]
+                view_xml_name = views[view_id]
+                model = self.openerp.pool.get(view['model'])
+                if model is None:
+                    # Check if model exists
+                    raise Exception(
+                        'View (xml id: %s) references model %s which does '
+                        'not exist' % (view_xml_name, view['model'])
+                    )
+                logger.info('Testing view %s (id: %s) v%s', view['name'], view['id'], view['version'])
+                if SkipViewValidation:
+                    try:
+                        if not validate(model, view, view['version']):
                             continue
-                    else:
-                        model.fields_view_get(txn.cursor, txn.user, view.id, view.type, version=view.version)
-                    if view.inherit_id:
-                        version = view.version
-                        while view.inherit_id:
-                            try:
-                                model.fields_view_get(
-                                    txn.cursor, txn.user, view.id, view.type
-                                )
-                            except ReferenceError as r_err:
-                                raise r_err
-                            logger.info(
-                                'Testing inherit view %s (id: %s)',
-                                view.name, view.id
-                            )
-                            view = view.inherit_id
-
-                        model.fields_view_get(txn.cursor, txn.user, view.id,
-                                              view.type, version=version)
-                        logger.info('Testing main view %s (id: %s) v%s',
-                                    view.name, view.id, version)
+                    except SkipViewValidation:
+                        continue
+                else:
+                    validate(model, view, view['version'])
+                if view['inherit_id']:
+                    version = view['version']
+                    while view['inherit_id']:
+                        validate(model, view)
+                        logger.info(
+                            'Testing inherit view %s (id: %s)',
+                            view['name'], view['id']
+                        )
+                        view = records[view['inherit_id'][0]]
+
+                    validate(model, view, version)
+                    logger.info('Testing main view %s (id: %s) v%s',
+                                view['name'], view['id'], version)
+
+            logger.info(
+                'Validated %s views in %.2fs', len(validated),
+                sum(t[0] for t in timings)
+            )
+            for elapsed, view_id in sorted(timings, reverse=True)[:10]:
+                logger.info(
+                    'View %s (id: %s) validated in %.3fs',
+                    views.get(view_id, records[view_id]['name']), view_id, elapsed
+                )
 
     def test_access_rules(self):
         """Test access rules for all the models created in the module
+
+        Uses a fixed number of bulk queries whatever the number of models.
         """
         logger.info('Testing access rules for module %s', self.config['module'])
         model_obj = self.openerp.pool.get('ir.model')
@@ -211,17 +448,28 @@ class OOBaseTests(OOTestCase):
                 ]
             imd_ids = imd_obj.search(txn.cursor, txn.user, search_params)
             if imd_ids:
-                for imd in imd_obj.browse(txn.cursor, txn.user, imd_ids):
-                    model_id = imd.res_id
-                    pool_model = model_obj.read(txn.cursor, txn.user, model_id, ['model'])['model']
+                imds = imd_obj.read(cursor, uid, imd_ids, ['name', 'res_id'])
+                model_ids = list(set(imd['res_id'] for imd in imds))
+                models = dict(
+                    (m['id'], m['model'])
+                    for m in model_obj.read(cursor, uid, model_ids, ['model'])
+                )
+                access_ids = access_obj.search(cursor, uid, [
+                    ('model_id', 'in', model_ids)
+                ])
+                models_with_access = set(
+                    a['model_id'][0]
+                    for a in access_obj.read(cursor, uid, access_ids, ['model_id'])
+                    if a['model_id']
+                )
+                for imd in imds:
+                    model_id = imd['res_id']
+                    pool_model = models.get(model_id)
                     if getattr(self.openerp.pool.get(pool_model), '_test_class', False):
                         continue
-                    access_ids = access_obj.search(cursor, uid, [
-                        ('model_id.id', '=', model_id)
-                    ])
-                    if not access_ids:
+                    if model_id not in models_with_access:
                         no_access.append(
-                            '.'.join(imd.name.split('_')[1:])
+                            '.'.join(imd['name'].split('_')[1:])
                         )
 
         if no_access:
@@ -238,7 +486,7 @@ class OOBaseTests(OOTestCase):
         from os.path import join, isdir
         from tools import trans_export
         from six.moves import StringIO
-        from destral.utils import compare_pofiles, TempDir
+        from destral.utils import compare_pofiles, scan_po
 
         if not self.config['testing_langs']:
             logger.warning(
@@ -274,68 +522,133 @@ class OOBaseTests(OOTestCase):
                 txn.cursor, txn.user, [self.config['module']], 'pot', trans_data
             )
 
-        with TempDir() as temp:
-            tmp_pot = '{}/{}.pot'.format(temp.dir, self.config['module'])
-            # Write POT data into temp file
-            with open(tmp_pot, 'w') as pot:
-                pot.write(trans_data.getvalue())
-            pot_path = join(trad_path, '{}.pot'.format(self.config['module']))
+        # Scanned once in memory and reused for the POT and every language
+        pot_messages = scan_po(trans_data)
+        pot_path = join(trad_path, '{}.pot'.format(self.config['module']))
+        missing_strings, untranslated_strings = compare_pofiles(
+            pot_messages, pot_path
+        )
+        # Don't compare untranslated strings in POT
+        #   because POT files do not contain translations
+        self.assertIsNotNone(
+            missing_strings,
+            'There is not a POT file for module {}'.format(
+                self.config['module']
+            )
+        )
+        self.assertItemsEqual(
+            [],
+            missing_strings,
+            'There are {} missing strings in the POT file'
+            ' of the module {}\nThe missing strings are:\n'
+            '\n{}\n'.format(
+                len(missing_strings), self.config['module'],
+                '\n'.join(missing_strings)
+            )
+        )
+        logger.info('Checking translations for langs: {}'.format(
+            self.config['testing_langs']
+        ))
+        for test_lang in self.config['testing_langs']:
+            po_path = join(trad_path, '{}.po'.format(test_lang))
             missing_strings, untranslated_strings = compare_pofiles(
-                tmp_pot, pot_path
+                pot_messages, po_path
             )
-            # Don't compare untranslated strings in POT
-            #   because POT files do not contain translations
             self.assertIsNotNone(
                 missing_strings,
-                'There is not a POT file for module {}'.format(
-                    self.config['module']
+                'There is not a PO file for module {}'
+                ' with locale: "{}"'.format(
+                    self.config['module'], test_lang
                 )
             )
             self.assertItemsEqual(
                 [],
                 missing_strings,
-                'There are {} missing strings in the POT file'
+                'There are {} missing strings in the PO file'
                 ' of the module {}\nThe missing strings are:\n'
                 '\n{}\n'.format(
                     len(missing_strings), self.config['module'],
                     '\n'.join(missing_strings)
                 )
             )
-            logger.info('Checking translations for langs: {}'.format(
-                self.config['testing_langs']
-            ))
-            for test_lang in self.config['testing_langs']:
-                po_path = join(trad_path, '{}.po'.format(test_lang))
-                missing_strings, untranslated_strings = compare_pofiles(
-                    tmp_pot, po_path
-                )
-                self.assertIsNotNone(
-                    missing_strings,
-                    'There is not a PO file for module {}'
-                    ' with locale: "{}"'.format(
-                        self.config['module'], test_lang
-                    )
-                )
-                self.assertItemsEqual(
-                    [],
-                    missing_strings,
-                    'There are {} missing strings in the PO file'
-                    ' of the module {}\nThe missing strings are:\n'
-                    '\n{}\n'.format(
-                        len(missing_strings), self.config['module'],
-                        '\n'.join(missing_strings)
-                    )
-                )
-                self.assertItemsEqual(
-                    [],
-                    untranslated_strings,
-                    'There are {} untranslated strings in the PO file'
-                    ' of the module {}\nThe untranslated strings are:\n'
-                    '\n{}\n'.format(
-                        len(untranslated_strings), self.config['module'],
-                        '\n'.join(untranslated_strings)
-                    )
+            self.assertItemsEqual(
+                [],
+                untranslated_strings,
+                'There are {} untranslated strings in the PO file'
+                ' of the module {}\nThe untranslated strings are:\n'
+                '\n{}\n'.format(
+                    len(untranslated_strings), self.config['module'],
+                    '\n'.join(untranslated_strings)
                 )
+            )
+
+
+def iter_suite_tests(suite):
+    """Iterate the test cases of a suite and its nested suites, in order.
+    """
+    for test in suite:
+        if isinstance(test, unittest.TestSuite):
+            for nested in iter_suite_tests(test):
+                yield nested
+        else:
+            yield test
+
+
+def shard_suite(suite, index, total, durations=None):
+    """Select a partition of the tests of a suite.
+
+    Tests are partitioned by a hash of their id or, with `durations`, with
+    the longest processing time first heuristic over their durations (tests
+    without a recorded duration count as the mean one). The partition only
+    depends on the test ids and `durations`, so every node of a CI run
+    given the same durations (never its local history) selects a different
+    set of tests and all of them together run the whole suite.
+
+    :param suite: Suite to split
+    :param index: Partition to select (from 1)
+    :param total: Number of partitions
+    :param durations: Dictionary with the duration of the tests by id
+    :return: a new OOTestSuite with the tests of the partition, in the
+        original order
+    """
+    from destral.scheduler import shard_modules
+    tests = list(iter_suite_tests(suite))
+    if durations:
+        test_ids = []
+        for test in tests:
+            if test.id() not in test_ids:
+                test_ids.append(test.id())
+        shards, _ = shard_modules(test_ids, total, durations.get)
+        selected = set(shards[index - 1])
+        partition = [t for t in tests if t.id() in selected]
+    else:
+        partition = [
+            t for t in tests
+            if (zlib.crc32(t.id().encode('utf-8')) & 0xffffffff) % total ==
+            index - 1
+        ]
+    logger.info(
+        'Running %s of %s tests in partition %s/%s',
+        len(partition), len(tests), index, total
+    )
+    return OOTestSuite(partition)
+
+
+def select_suite(suite, test_ids):
+    """Select the tests of a suite by id.
+
+    The :class:`OOBaseTests` (views, access rules and translations) are
+    always kept, they check the whole module and not some lines.
+
+    :param suite: Suite to filter
+    :param test_ids: Ids of the tests to keep
+    :return: a new OOTestSuite with the selected tests, in the original
+        order
+    """
+    return OOTestSuite([
+        t for t in iter_suite_tests(suite)
+        if t.id() in test_ids or isinstance(t, OOBaseTests)
+    ])
 
 
 def get_unittest_suite(module, tests=None):
@@ -369,8 +682,78 @@ def get_unittest_suite(module, tests=None):
     return suite
 
 
-def run_unittest_suite(suite):
+class TestTimingsMixin(object):
+    """Test result recording the duration of every test in `test_timings`,
+    a dictionary with the test ids and their duration in seconds.
+    """
+
+    def startTest(self, test):
+        if not hasattr(self, 'test_timings'):
+            self.test_timings = {}
+        self._test_started_at = time.time()
+        super(TestTimingsMixin, self).startTest(test)
+
+    def stopTest(self, test):
+        super(TestTimingsMixin, self).stopTest(test)
+        self.test_timings[test.id()] = time.time() - self._test_started_at
+
+
+class CoverageContextMixin(object):
+    """Test result switching the coverage context to every test, so the
+    coverage data records which lines each test executed (see
+    :class:`destral.impact.ImpactMap`).
+
+    :ivar coverage: Started coverage or None to not record contexts
+    :ivar context_module: Module of the tests
+    """
+    coverage = None
+    context_module = None
+
+    def startTest(self, test):
+        if self.coverage is not None:
+            self.coverage.switch_context(
+                coverage_test_context(self.context_module, test.id())
+            )
+        super(CoverageContextMixin, self).startTest(test)
+
+    def stopTest(self, test):
+        super(CoverageContextMixin, self).stopTest(test)
+        if self.coverage is not None:
+            self.coverage.switch_context('')
+
+
+class TimedTextTestResult(
+        CoverageContextMixin, TestTimingsMixin, unittest.TextTestResult):
+    pass
+
+
+class TimedJUnitXMLResult(
+        CoverageContextMixin, TestTimingsMixin, JUnitXMLResult):
+    pass
+
+
+class OOTestRunner(unittest.TextTestRunner):
+    """Runner passing the coverage to record the test contexts to the result.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.coverage = kwargs.pop('coverage', None)
+        self.context_module = kwargs.pop('context_module', None)
+        super(OOTestRunner, self).__init__(*args, **kwargs)
+
+    def _makeResult(self):
+        result = super(OOTestRunner, self)._makeResult()
+        result.coverage = self.coverage
+        result.context_module = self.context_module
+        return result
+
+
+def run_unittest_suite(suite, coverage=None, context_module=None):
     """Run test suite
+
+    :param suite: Suite to run
+    :param coverage: Started coverage to record a context for every test
+    :param context_module: Module of the tests, prefix of the contexts
     """
     logger.info('Running test suit: {0}'.format(suite))
     confs = config_from_environment(
@@ -379,9 +762,10 @@ def run_unittest_suite(suite):
     )
     verbose = confs.get('verbose', 2)
     junitxml = confs.get('junitxml', False)
-    result = JUnitXMLResult if junitxml else unittest.TextTestResult
-    return unittest.TextTestRunner(
-        verbosity=verbose, resultclass=result, stream=LoggerStream
+    result = TimedJUnitXMLResult if junitxml else TimedTextTestResult
+    return OOTestRunner(
+        verbosity=verbose, resultclass=result, stream=LoggerStream,
+        coverage=coverage, context_module=context_module
     ).run(suite)
 
 
@@ -397,7 +781,12 @@ def get_spec_suite(module):
         'DESTRAL', ['verbose', 'junitxml'],
         verbose=2, junitxml=False
     ).get('junitxml', False)
-    if os.path.exists(spec_dir) or os.path.exists(specs_dir):
+    entry = ManifestIndex.lookup(module)
+    if entry is not None:
+        has_specs = entry['spec'] or entry['specs']
+    else:
+        has_specs = os.path.exists(spec_dir) or os.path.exists(specs_dir)
+    if has_specs:
         # Create a fake arguments object
         arguments = type('Arguments', (object, ), {})
         arguments.specs = [spec_dir, specs_dir]
@@ -1,10 +1,20 @@
+from copy import deepcopy
 from threading import local
+import re
 import six
 
 
 from destral.openerp import OpenERPService
+from osconf import config_from_environment
 from signals import DB_CURSOR_EXECUTE
 
+CONTEXT_WRITE_RE = re.compile(
+    r'^\s*(insert\s+into|update|delete\s+from)\s+"?(res_users|res_lang)\b',
+    re.IGNORECASE
+)
+"""Queries invalidating the cached user contexts
+"""
+
 
 class Singleton(type):
     """Metaclass for singleton pattern.
@@ -34,15 +44,39 @@ class Transaction(local):
     context = None
     ws = None
 
+    """Cache the user context by database and user?
+    (`DESTRAL_CACHE_CONTEXT` environment variable, True by default)
+    """
+    cache_context = config_from_environment(
+        'DESTRAL', [], cache_context=True
+    )['cache_context']
+
+    _context_cache = {}
+
     def __init__(self):
         pass
 
-    def start(self, database_name, user=1, context=None):
+    @classmethod
+    def clear_context_cache(cls, database_name=None):
+        """Invalidate the cached user contexts
+
+        :param database_name: Database to invalidate (all by default)
+        """
+        if database_name is None:
+            cls._context_cache.clear()
+        else:
+            for key in list(cls._context_cache):
+                if key[0] == database_name:
+                    del cls._context_cache[key]
+
+    def start(self, database_name, user=1, context=None, cache_context=None):
         """Start a new transaction
 
         :param database_name: Database name
         :param user: User id
         :param context: Context to be used
+        :param cache_context: Use the cached user context (`cache_context`
+            class setting by default)
         """
         self._assert_stopped()
         self.service = OpenERPService(db_name=database_name)
@@ -53,10 +87,17 @@ class Transaction(local):
         self.ws = WebServiceTracker(db=self.service.db, uid=user)
         self.service.ws_stack.push(self.ws)
         self.user = user
+        if cache_context is None:
+            cache_context = self.cache_context
         try:
             receivers = DB_CURSOR_EXECUTE.receivers
             DB_CURSOR_EXECUTE.receivers = {}
-            self.context = context if context is not None else self.get_context()
+            if context is not None:
+                self.context = context
+            elif cache_context:
+                self.context = self.get_cached_context(database_name)
+            else:
+                self.context = self.get_context()
         finally:
             DB_CURSOR_EXECUTE.receivers = receivers
         return self
@@ -85,6 +126,18 @@ class Transaction(local):
         user_obj = self.pool.get('res.users')
         return user_obj.context_get(self.cursor, self.user)
 
+    def get_cached_context(self, database_name):
+        """Loads the context of the current user from the cache
+
+        Cached contexts are invalidated on writes to `res.users` or `res.lang`
+        and when modules are installed.
+        """
+        key = (database_name, self.user)
+        context = self._context_cache.get(key)
+        if context is None:
+            context = self._context_cache[key] = self.get_context()
+        return deepcopy(context)
+
     def __enter__(self):
         return self
 
@@ -105,3 +158,16 @@ class Transaction(local):
                 self.stop()
                 return self._assert_stopped(True)
             raise ae
+
+
+def invalidate_context_on_write(sender, *args, **kwargs):
+    """Receiver of `DB_CURSOR_EXECUTE` invalidating the cached user contexts
+    when a query writes to `res_users` or `res_lang`.
+    """
+    for value in (sender,) + args + tuple(kwargs.values()):
+        if isinstance(value, six.string_types) and CONTEXT_WRITE_RE.search(value):
+            Transaction.clear_context_cache()
+            return
+
+
+DB_CURSOR_EXECUTE.connect(invalidate_context_on_write)
@@ -1,5 +1,10 @@
 from ast import literal_eval
+from collections import OrderedDict
+import atexit
+import hashlib
 import imp
+import io
+import json
 import logging
 import os
 import re
@@ -11,13 +16,28 @@ import six
 
 __all__ = [
     'update_config',
+    'get_cache_dir',
+    'ManifestIndex',
+    'ModuleGraph',
+    'ModuleRoots',
     'detect_module',
+    'detect_modules',
     'module_exists',
+    'get_manifest',
     'get_dependencies',
     'sort_modules_by_dependencies',
+    'get_impacted_modules',
     'find_files',
+    'iter_diff_files',
+    'get_pull_request_files',
+    'plan_requirements',
+    'install_modules_requirements',
     'install_requirements',
-    'coverage_modules_path'
+    'coverage_modules_path',
+    'scan_po',
+    'load_po',
+    'compare_po_messages',
+    'compare_pofiles'
 ]
 
 
@@ -29,25 +49,72 @@ def update_config(config, **kwargs):
     return config
 
 
+class ModuleRoots(object):
+    """Shared cache of the directories known to be (or not be) in a module.
+
+    Each directory is resolved with a single `stat` of its `__terp__.py` and
+    the answer is remembered for it and all the directories walked below it,
+    so sibling paths are resolved without walking the filesystem again. Only
+    directories are remembered, files are resolved by their directory.
+    """
+
+    def __init__(self):
+        self.known = {}
+
+    def module_of(self, path):
+        """Detect the module of a path.
+
+        :param path: to examine
+        :return: None if is not a module or the module name
+        """
+        if not os.path.isdir(path):
+            path = os.path.dirname(path)
+        stack = path.split(os.path.sep)
+        if not stack[0]:
+            stack[0] = os.path.sep
+        stack = [x for x in stack if x]
+        walked = []
+        module = None
+        while stack:
+            path = os.path.join(*stack)
+            name = stack.pop()
+            if path in self.known:
+                module = self.known[path]
+                break
+            walked.append(path)
+            if os.path.isfile(os.path.join(path, '__terp__.py')):
+                module = name
+                break
+        for path in walked:
+            self.known[path] = module
+        return module
+
+
 def detect_module(path):
     """Detect if a path is part of a openerp module or not
 
     :param path: to examine
     :return: None if is not a module or the module name
     """
-    stack = path.split(os.path.sep)
-    if not stack[0]:
-        stack[0] = os.path.sep
-    stack = [x for x in stack if x]
-    while stack:
-        path = os.path.join(*stack)
-        module = stack.pop()
-        if not os.path.isdir(path):
-            continue
-        files = os.listdir(path)
-        if '__terp__.py' in files:
-            return module
-    return None
+    return ModuleRoots().module_of(path)
+
+
+def detect_modules(paths, roots=None):
+    """Detect the modules of a list of paths in one pass.
+
+    :param paths: Paths to examine, eg. from `find_files` or `git diff`
+    :param roots: ModuleRoots cache to use (a new one by default)
+    :return: an ordered dictionary with the modules, in order of appearance,
+        and the list of their paths
+    """
+    if roots is None:
+        roots = ModuleRoots()
+    modules = OrderedDict()
+    for path in paths:
+        module = roots.module_of(path)
+        if module:
+            modules.setdefault(module, []).append(path)
+    return modules
 
 
 def module_exists(module):
@@ -76,6 +143,349 @@ def module_exists(module):
                 return True
 
 
+def get_cache_dir():
+    """Directory where destral keeps its caches between runs.
+
+    Defined by `DESTRAL_CACHE_DIR` or `~/.cache/destral` by default.
+    """
+    cache_dir = os.environ.get('DESTRAL_CACHE_DIR') or os.path.join(
+        os.path.expanduser('~'), '.cache', 'destral'
+    )
+    if not os.path.isdir(cache_dir):
+        try:
+            os.makedirs(cache_dir)
+        except OSError:
+            # Created by another process meanwhile
+            if not os.path.isdir(cache_dir):
+                raise
+    return cache_dir
+
+
+def write_json_atomic(path, data):
+    """Write `data` as JSON replacing `path` atomically.
+    """
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(path), prefix='.tmp', suffix='.json'
+    )
+    try:
+        with os.fdopen(fd, 'w') as tmp_file:
+            json.dump(data, tmp_file, separators=(',', ':'))
+        os.rename(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class ManifestIndex(object):
+    """Index of the modules of an addons path.
+
+    For every module it stores the parsed manifest, its dependencies, if it
+    has `tests`, `spec` or `specs` directories and its `requirements*.txt`
+    files. Entries are invalidated by the mtime and size of `__terp__.py` and
+    the mtime of the module directory.
+
+    When `path` is set the index is persisted as JSON there, so the next runs
+    don't need to read the manifests again. Use :meth:`ManifestIndex.get` to
+    share the index of an addons path, persisted in the cache directory when
+    `DESTRAL_MANIFEST_CACHE` is set (as the CLI does).
+
+    :param addons_path: Path to find the modules
+    :param path: JSON file to persist the index (None to keep it in memory)
+    """
+
+    VERSION = 2
+
+    _indexes = {}
+
+    def __init__(self, addons_path, path=None):
+        self.addons_path = addons_path
+        self.path = path
+        self.dirty = False
+        self.data = {
+            'version': self.VERSION, 'addons_mtime': None, 'modules': [],
+            'entries': {}
+        }
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r') as index_file:
+                    data = json.load(index_file)
+                if data.get('version') == self.VERSION:
+                    self.data = data
+            except ValueError:
+                logging.getLogger('destral.utils').warning(
+                    'Ignoring corrupted manifest index %s', path
+                )
+
+    @classmethod
+    def get(cls, addons_path):
+        """Get the shared index of an addons path.
+        """
+        addons_path = os.path.normpath(addons_path)
+        index = cls._indexes.get(addons_path)
+        if index is None:
+            path = None
+            if os.environ.get('DESTRAL_MANIFEST_CACHE'):
+                key = hashlib.sha1(
+                    os.path.realpath(addons_path).encode('utf-8')
+                ).hexdigest()[:12]
+                path = os.path.join(
+                    get_cache_dir(), 'manifests-{}.json'.format(key)
+                )
+            index = cls._indexes[addons_path] = cls(addons_path, path)
+            if path:
+                atexit.register(index.save)
+        return index
+
+    @classmethod
+    def lookup(cls, module_path):
+        """Entry of a module path if its addons path is already indexed.
+
+        :param module_path: Path of the module
+        :return: the entry or None
+        """
+        module_path = os.path.normpath(module_path)
+        index = cls._indexes.get(os.path.dirname(module_path))
+        if index is None:
+            return None
+        return index.entry(os.path.basename(module_path))
+
+    def modules(self):
+        """All the modules in the addons path.
+
+        :return: a list with the module names
+        """
+        data = self.data
+        mtime = os.stat(self.addons_path).st_mtime
+        if data['addons_mtime'] != mtime:
+            pj = os.path.join
+            data['modules'] = sorted(
+                m for m in os.listdir(self.addons_path)
+                if os.path.isfile(pj(self.addons_path, m, '__terp__.py'))
+            )
+            data['addons_mtime'] = mtime
+            self.dirty = True
+        return data['modules']
+
+    def entry(self, module):
+        """Index entry of a module, refreshed if the module changed.
+
+        :param module: Module name
+        :return: a dictionary or None if it is not a valid module
+        """
+        pj = os.path.join
+        module_path = pj(self.addons_path, module)
+        try:
+            terp_stat = os.stat(pj(module_path, '__terp__.py'))
+            dir_mtime = os.stat(module_path).st_mtime
+        except OSError:
+            return None
+        terp = [terp_stat.st_mtime, terp_stat.st_size]
+        entry = self.data['entries'].get(module)
+        if entry is None or entry['terp'] != terp or \
+                entry['dir_mtime'] != dir_mtime:
+            entry = self._scan(module_path)
+            entry['terp'] = terp
+            entry['dir_mtime'] = dir_mtime
+            self.data['entries'][module] = entry
+            self.dirty = True
+        return entry
+
+    @staticmethod
+    def _scan(module_path):
+        with open(os.path.join(module_path, '__terp__.py'), 'r') as terp_file:
+            manifest = literal_eval(terp_file.read())
+        names = os.listdir(module_path)
+        dirs = [
+            n for n in ('tests', 'spec', 'specs')
+            if n in names and os.path.isdir(os.path.join(module_path, n))
+        ]
+        return {
+            'manifest': manifest,
+            'depends': list(manifest.get('depends', [])),
+            'tests': 'tests' in dirs,
+            'spec': 'spec' in dirs,
+            'specs': 'specs' in dirs,
+            'requirements': sorted(
+                n for n in names
+                if n.startswith('requirements') and n.endswith('.txt')
+            ),
+        }
+
+    def save(self):
+        """Persist the index if it changed.
+        """
+        if not self.path or not self.dirty:
+            return
+        if not os.path.isdir(os.path.dirname(self.path)):
+            # Cache directory removed meanwhile
+            return
+        try:
+            write_json_atomic(self.path, self.data)
+            self.dirty = False
+        except (IOError, OSError, TypeError, ValueError) as e:
+            logging.getLogger('destral.utils').warning(
+                'Could not save manifest index %s: %s', self.path, e
+            )
+
+
+class ModuleGraph(object):
+    """Dependency graph of the modules found in an addons path.
+
+    Manifests come from a :class:`ManifestIndex`, so they are parsed only when
+    their `__terp__.py` changes. Use :meth:`ModuleGraph.get` to share the
+    graph (backed by the persistent index) of an addons path.
+
+    :param addons_path: Path to find the modules
+    :param index: ManifestIndex to use (an in-memory one by default)
+    """
+
+    _graphs = {}
+
+    def __init__(self, addons_path, index=None):
+        self.addons_path = addons_path
+        if index is None:
+            index = ManifestIndex(addons_path)
+        self.index = index
+        self._reverse = None
+        self._reverse_depends = None
+
+    @classmethod
+    def get(cls, addons_path):
+        """Get the shared graph of an addons path.
+        """
+        graph = cls._graphs.get(addons_path)
+        if graph is None:
+            graph = cls._graphs[addons_path] = cls(
+                addons_path, ManifestIndex.get(addons_path)
+            )
+        return graph
+
+    def modules(self):
+        """All the modules in the addons path.
+
+        :return: a set with the module names
+        """
+        return set(self.index.modules())
+
+    def manifest(self, module):
+        """Parsed `__terp__.py` manifest of a module.
+
+        :param module: Module name
+        :return: the manifest dictionary
+        """
+        entry = self.index.entry(module)
+        if entry is None:
+            module_path = os.path.join(self.addons_path, module)
+            if not os.path.exists(module_path):
+                raise Exception('Module \'{}\' not found in {}'.format(
+                    module, self.addons_path
+                ))
+            raise Exception(
+                'Module {} is not a valid module. Missing __terp__.py '
+                'file'.format(module)
+            )
+        return entry['manifest']
+
+    def depends(self, module):
+        """Direct dependencies of a module.
+        """
+        return self.manifest(module).get('depends', [])
+
+    def dependencies(self, module):
+        """Transitive dependencies of a module.
+
+        :param module: Module name
+        :return: a set with the dependencies
+        """
+        deps = set()
+        stack = list(self.depends(module))
+        while stack:
+            dep = stack.pop()
+            if dep not in deps:
+                deps.add(dep)
+                stack.extend(self.depends(dep))
+        return deps
+
+    def dependents(self, module, depth=None):
+        """Transitive dependents of a module (modules that depend on it).
+
+        :param module: Module name
+        :param depth: Maximum distance to `module` (None for no limit)
+        :return: a set with the dependents
+        """
+        # The manifests are refreshed by their mtime, so a changed `depends`
+        # rebuilds the reverse dependencies
+        depends = [(m, self._safe_depends(m)) for m in sorted(self.modules())]
+        if depends != self._reverse_depends:
+            reverse = dict((m, []) for m, _ in depends)
+            for m, deps in depends:
+                for dep in deps:
+                    reverse.setdefault(dep, []).append(m)
+            self._reverse = reverse
+            self._reverse_depends = depends
+        dependents = set()
+        level = [module]
+        distance = 0
+        while level and (depth is None or distance < depth):
+            distance += 1
+            next_level = []
+            for m in level:
+                for dependent in self._reverse.get(m, []):
+                    if dependent not in dependents and dependent != module:
+                        dependents.add(dependent)
+                        next_level.append(dependent)
+            level = next_level
+        return dependents
+
+    def sort(self, modules):
+        """Sort modules so that dependencies come before their dependents.
+
+        Modules whose manifest can not be read are considered to have no
+        dependencies and circular dependencies are ignored.
+
+        :param modules: Module names to sort
+        :return: a list with the sorted modules
+        """
+        wanted = set(modules)
+        sorted_modules = []
+        visited = set()
+        for module in modules:
+            if module in visited:
+                continue
+            visited.add(module)
+            # Iterative post-order DFS: (module, pending dependencies)
+            stack = [(module, iter(self._safe_depends(module)))]
+            while stack:
+                current, deps = stack[-1]
+                for dep in deps:
+                    if dep not in visited:
+                        visited.add(dep)
+                        stack.append((dep, iter(self._safe_depends(dep))))
+                        break
+                else:
+                    stack.pop()
+                    if current in wanted:
+                        sorted_modules.append(current)
+        return sorted_modules
+
+    def _safe_depends(self, module):
+        try:
+            return self.depends(module)
+        except Exception:
+            return []
+
+
+def get_manifest(module, addons_path):
+    """Read the `__terp__.py` manifest of a module
+
+    :param module: Module name
+    :param addons_path: Path to find the modules
+    :return: the manifest dictionary
+    """
+    return ModuleGraph.get(addons_path).manifest(module)
+
+
 def get_dependencies(module, addons_path=None, deps=None):
     """Get all the dependencies of a module without database
 
@@ -86,34 +496,14 @@ def get_dependencies(module, addons_path=None, deps=None):
     :param addons_path: Path to find the modules
     :return: a listt of dependencies.
     """
-    if deps is None:
-        deps = []
     if addons_path is None:
         from destral.openerp import OpenERPService
         service = OpenERPService()
         addons_path = service.config['addons_path']
-    pj = os.path.join
-    module_path = pj(addons_path, module)
-    if not os.path.exists(module_path):
-        raise Exception('Module \'{}\' not found in {}'.format(
-            module, addons_path
-        ))
-    terp_path = pj(module_path, '__terp__.py')
-    if not os.path.exists(terp_path):
-        raise Exception(
-            'Module {} is not a valid module. Missing __terp__.py file'.format(
-                module
-            )
-        )
-    with open(terp_path, 'r') as terp_file:
-        terp = literal_eval(terp_file.read())
-
-    for dep in terp['depends']:
-        if dep not in deps:
-            deps.append(dep)
-            deps += get_dependencies(dep, addons_path, deps)
-
-    return list(set(deps))
+    dependencies = ModuleGraph.get(addons_path).dependencies(module)
+    if deps:
+        dependencies.update(deps)
+    return list(dependencies)
 
 
 def sort_modules_by_dependencies(modules, addons_path):
@@ -129,75 +519,355 @@ def sort_modules_by_dependencies(modules, addons_path):
     """
     if not modules:
         return []
-    
-    # Build dependency graph for all modules
-    module_deps = {}
-    for module in modules:
-        try:
-            deps = get_dependencies(module, addons_path)
-            # Only keep dependencies that are in our module list
-            module_deps[module] = [d for d in deps if d in modules]
-        except Exception:
-            # If we can't get dependencies, assume no deps
-            module_deps[module] = []
-    
-    # Topological sort
-    sorted_modules = []
-    visited = set()
-    visiting = set()
-    
-    def visit(module):
-        if module in visited:
-            return
-        if module in visiting:
-            # Circular dependency detected, just continue
-            return
-        
-        visiting.add(module)
-        for dep in module_deps.get(module, []):
-            if dep in modules:  # Only visit if in our list
-                visit(dep)
-        visiting.remove(module)
-        visited.add(module)
-        sorted_modules.append(module)
-    
+    return ModuleGraph.get(addons_path).sort(modules)
+
+
+def get_impacted_modules(modules, addons_path, depth=None):
+    """Modules impacted by a change in `modules`.
+
+    :param modules: Changed modules
+    :param addons_path: Path to find the modules
+    :param depth: Maximum distance of the dependents (None for no limit)
+    :return: a list with `modules` followed by their dependents
+    """
+    graph = ModuleGraph.get(addons_path)
+    impacted = list(modules)
+    seen = set(impacted)
     for module in modules:
-        visit(module)
-    
-    return sorted_modules
+        for dependent in sorted(graph.dependents(module, depth=depth)):
+            if dependent not in seen:
+                seen.add(dependent)
+                impacted.append(dependent)
+    return impacted
+
+
+DIFF_FILE_RE = re.compile(u"--- a/.*|\\+\\+\\+ b/.*")
+"""Lines of a diff naming the files implicated
+"""
+
+
+def iter_diff_files(lines):
+    """Yield the files implicated in a diff, parsing it line by line
+
+    Every file is yielded once and only the set of paths is kept in memory.
+
+    :param lines: Iterable with the lines of the diff
+    """
+    seen = set()
+    for line in lines:
+        if isinstance(line, six.binary_type):
+            line = line.decode('utf-8', 'replace')
+        for match in DIFF_FILE_RE.findall(line):
+            path = u'/'.join(match.split(u'/')[1:])
+            if path not in seen:
+                seen.add(path)
+                yield path
 
 
 def find_files(diff):
     """Return all the files implicated in a diff
     """
-    paths = []
-    for line in re.findall(u"--- a/.*|\+\+\+ b/.*", diff):
-        line = u'/'.join(line.split(u'/')[1:])
-        paths.append(line)
-    return list(set(paths))
+    return list(iter_diff_files(diff.split(u'\n')))
+
+
+def get_pull_request_files(repository, pr_number, token, files_api=False):
+    """Files changed in a GitHub pull request
+
+    The diff of the pull request is streamed and parsed line by line. With
+    `files_api` the paginated "list pull request files" API is used instead,
+    which is lighter but limited by GitHub to 3000 files.
+
+    :param repository: Repository as `owner/name`
+    :param pr_number: Pull request number
+    :param token: GitHub token
+    :param files_api: Use the pull request files API instead of the diff
+    :return: a list of paths
+    """
+    import requests
+    url = 'https://api.github.com/repos/{repo}/pulls/{pr_number}'.format(
+        repo=repository,
+        pr_number=pr_number
+    )
+    headers = {'Authorization': 'token {0}'.format(token)}
+    if files_api:
+        paths = []
+        seen = set()
+        url += '/files'
+        params = {'per_page': 100}
+        while url:
+            req = requests.get(url, headers=headers, params=params)
+            req.raise_for_status()
+            for pr_file in req.json():
+                for key in ('filename', 'previous_filename'):
+                    path = pr_file.get(key)
+                    if path and path not in seen:
+                        seen.add(path)
+                        paths.append(path)
+            url = req.links.get('next', {}).get('url')
+            params = None
+        return paths
+    headers['Accept'] = 'application/vnd.github.diff'
+    req = requests.get(url, headers=headers, stream=True)
+    try:
+        req.encoding = req.encoding or 'utf-8'
+        return list(iter_diff_files(
+            req.iter_lines(decode_unicode=True, delimiter=u'\n')
+        ))
+    finally:
+        req.close()
+
+
+REQUIREMENTS_FILES = ('requirements.txt', 'requirements-dev.txt')
+"""Requirements files installed for every module
+"""
+
+REQUIREMENTS_OPTION_RE = re.compile(
+    r'^(-r|--requirement|-c|--constraint)(?:\s+|=)(.+)$'
+)
+"""Requirements lines referencing another file
+"""
+
+
+REQUIREMENT_NAME_RE = re.compile(
+    r'^([A-Za-z0-9][A-Za-z0-9._-]*)\s*(?=$|[\[;@<>=!~])'
+)
+"""Project name of a requirement line (not an option, path or URL)
+"""
+
+REQUIREMENT_RE = re.compile(
+    r'^([A-Za-z0-9][A-Za-z0-9._-]*)\s*(?:\[([^\]]*)\])?\s*([<>=!~][^;@]*)?$'
+)
+"""Requirement lines that can be combined: name, extras and specifiers
+"""
+
+SPECIFIER_RE = re.compile(r'^(===|==|!=|<=|>=|~=|<|>)\s*([^\s,]+)$')
+"""Version specifier of a requirement
+"""
+
+
+def parse_requirement(line):
+    """Project of a requirement line, with its extras and specifiers
+
+    :param line: Requirement line
+    :return: a tuple with the normalized project name, the list of extras
+        and the list of specifiers (None when they can not be combined, like
+        lines with markers or URLs) or None if the line is not a project
+        requirement (options, paths and URLs)
+    """
+    match = REQUIREMENT_NAME_RE.match(line)
+    if not match:
+        return None
+    name = re.sub(r'[-_.]+', '-', match.group(1)).lower()
+    match = REQUIREMENT_RE.match(line)
+    if not match:
+        return name, None, None
+    extras = [e.strip() for e in (match.group(2) or '').split(',')
+              if e.strip()]
+    specifiers = []
+    for specifier in (match.group(3) or '').split(','):
+        specifier = specifier.strip()
+        if not specifier:
+            continue
+        specifier_match = SPECIFIER_RE.match(specifier)
+        if not specifier_match:
+            return name, None, None
+        specifiers.append(''.join(specifier_match.groups()))
+    return name, extras, specifiers
+
+
+def merge_requirements(lines):
+    """Merge the requirement lines of the same project
+
+    A single pip install refuses a project required twice with different
+    lines ("Double requirement given" with the legacy resolver), so the
+    extras and specifiers of the lines of a project are combined. A line
+    that can not be combined (markers, URLs) replaces the previous lines of
+    its project, the later one winning as with separate installs.
+
+    :param lines: Requirement lines, in install order
+    :return: a list with the merged lines, in the order their project
+        appears first
+    """
+    logger = logging.getLogger('destral.utils')
+    merged = OrderedDict()
+    for line in lines:
+        requirement = parse_requirement(line)
+        if requirement is None:
+            merged.setdefault(line, line)
+            continue
+        name, extras, specifiers = requirement
+        previous = merged.get(name)
+        if previous is None:
+            merged[name] = (line, extras, specifiers)
+            continue
+        previous_line, previous_extras, previous_specifiers = previous
+        if line == previous_line:
+            continue
+        if specifiers is None or previous_specifiers is None:
+            logger.warning(
+                'Requirement %s replaces %s', line, previous_line
+            )
+            merged[name] = (line, extras, specifiers)
+            continue
+        for extra in extras:
+            if extra not in previous_extras:
+                previous_extras.append(extra)
+        for specifier in specifiers:
+            if specifier not in previous_specifiers:
+                previous_specifiers.append(specifier)
+        combined = REQUIREMENT_NAME_RE.match(previous_line).group(1)
+        if previous_extras:
+            combined += '[{}]'.format(','.join(previous_extras))
+        combined += ','.join(previous_specifiers)
+        merged[name] = (combined, previous_extras, previous_specifiers)
+    return [
+        value if isinstance(value, six.string_types) else value[0]
+        for value in merged.values()
+    ]
+
+
+def read_requirements(path):
+    """Requirement lines of a requirements file
+
+    Comments and blank lines are dropped and relative paths of `-r` and `-c`
+    lines are made absolute, so the lines can be merged into another file.
+
+    :param path: Requirements file path
+    :return: a list of lines
+    """
+    lines = []
+    base_dir = os.path.dirname(os.path.abspath(path))
+    with io.open(path, 'r', encoding='utf-8') as requirements:
+        for line in requirements:
+            line = line.split(' #')[0].strip()
+            if not line or line.startswith('#'):
+                continue
+            match = REQUIREMENTS_OPTION_RE.match(line)
+            if match:
+                option, ref_path = match.groups()
+                line = '{} {}'.format(
+                    option, os.path.join(base_dir, ref_path.strip())
+                )
+            lines.append(line)
+    return lines
+
+
+def hash_requirements_references(digest, lines, seen=None):
+    """Hash the files referenced by requirement lines, recursively
+
+    :param digest: hashlib object to update with the path and content of
+        every file referenced with `-r` or `-c`
+    :param lines: Requirement lines, as returned by `read_requirements`
+    :param seen: Set of the paths already hashed
+    """
+    if seen is None:
+        seen = set()
+    for line in lines:
+        match = REQUIREMENTS_OPTION_RE.match(line)
+        if not match:
+            continue
+        path = match.group(2).strip()
+        if path in seen:
+            continue
+        seen.add(path)
+        digest.update(path.encode('utf-8'))
+        if not os.path.isfile(path):
+            continue
+        with open(path, 'rb') as requirements:
+            digest.update(requirements.read())
+        hash_requirements_references(digest, read_requirements(path), seen)
+
+
+def plan_requirements(modules, addons_path):
+    """Merged requirements of the modules and all their dependencies
+
+    :param modules: Modules to test
+    :param addons_path: Path to find the modules
+    :return: a list with the requirement lines, in dependency order, with
+        a single line per project (see :func:`merge_requirements`)
+    """
+    graph = ModuleGraph.get(addons_path)
+    all_modules = set(modules)
+    for module in modules:
+        all_modules.update(graph.dependencies(module))
+    lines = []
+    for module in graph.sort(sorted(all_modules)):
+        entry = graph.index.entry(module)
+        if entry is None:
+            continue
+        for filename in REQUIREMENTS_FILES:
+            if filename in entry['requirements']:
+                path = os.path.join(addons_path, module, filename)
+                lines.extend(read_requirements(path))
+    return merge_requirements(lines)
+
+
+def install_modules_requirements(modules, addons_path, constraints_file=''):
+    """Install the requirements of the modules with a single pip call
+
+    The merged requirements are hashed together with the files they include
+    (recursively), the constraints file and the python prefix. When the hash
+    matches the stamp of the previous install the step is skipped.
+
+    :param modules: Modules to test
+    :param addons_path: Path to find the modules
+    :param constraints_file: pip constraints file
+    :return: True if pip has been called
+    """
+    logger = logging.getLogger('destral.utils')
+    pip = os.path.join(sys.prefix, 'bin', 'pip')
+    if not os.path.exists(pip):
+        return False
+    plan = plan_requirements(modules, addons_path)
+    if not plan:
+        return False
+    content = u'\n'.join(plan) + u'\n'
+    digest = hashlib.sha1(content.encode('utf-8'))
+    seen = set()
+    hash_requirements_references(digest, plan, seen)
+    if constraints_file:
+        with open(constraints_file, 'rb') as constraints:
+            digest.update(constraints.read())
+        hash_requirements_references(
+            digest, read_requirements(constraints_file), seen
+        )
+    digest.update(sys.prefix.encode('utf-8'))
+    key = digest.hexdigest()
+
+    cache_dir = get_cache_dir()
+    prefix_hash = hashlib.sha1(sys.prefix.encode('utf-8')).hexdigest()[:12]
+    stamp_path = os.path.join(
+        cache_dir, 'requirements-{}.stamp'.format(prefix_hash)
+    )
+    if os.path.exists(stamp_path):
+        with open(stamp_path, 'r') as stamp:
+            if stamp.read().strip() == key:
+                logger.info('Requirements already installed, skipping')
+                return False
+
+    requirements_path = os.path.join(
+        cache_dir, 'requirements-{}.txt'.format(prefix_hash)
+    )
+    with io.open(requirements_path, 'w', encoding='utf-8') as requirements:
+        requirements.write(content)
+    logger.info(
+        'Installing %s requirements of %s modules', len(plan), len(modules)
+    )
+    command = [pip, 'install', '-r', requirements_path]
+    if constraints_file:
+        command[2:2] = ['-c', constraints_file]
+    subprocess.check_call(command)
+    with open(stamp_path, 'w') as stamp:
+        stamp.write(key)
+    return True
 
 
 def install_requirements(module, addons_path, constraints_file=''):
     """Install module requirements and its dependecies
     """
-    pip = os.path.join(sys.prefix, 'bin', 'pip')
-    if os.path.exists(pip):
-        logger = logging.getLogger('destral.utils')
-        modules_requirements = get_dependencies(module, addons_path)
-        modules_requirements.append(module)
-        for module_requirements in modules_requirements:
-            addons_path_module = os.path.join(addons_path, module_requirements)
-            requirements_files = [
-                os.path.join(addons_path_module, 'requirements.txt'),
-                os.path.join(addons_path_module, 'requirements-dev.txt')
-            ]
-            for req in requirements_files:
-                if os.path.exists(req):
-                    logger.info('Requirements file %s found. Installing...', req)
-                    if constraints_file:
-                        subprocess.check_call([pip, "install", "-c", constraints_file, "-r", req])
-                    else:
-                        subprocess.check_call([pip, "install", "-r", req])
+    return install_modules_requirements(
+        [module], addons_path, constraints_file=constraints_file
+    )
 
 
 def coverage_modules_path(modules_to_test, addons_path):
@@ -249,38 +919,130 @@ def read_po(po_path):
         return catalog
 
 
-def compare_pofiles(pathA, pathB):
+PO_KEYWORD_RE = re.compile(r'^(msgctxt|msgid_plural|msgid|msgstr(?:\[\d+\])?)\s+(".*")\s*$')
+"""Keyword lines of a po/pot file
+"""
+
+_PO_MESSAGES_CACHE = {}
+
+
+def scan_po(lines):
+    """Scan the messages of a po/pot file
+
+    Streaming scanner collecting only the msgids and whether they have a
+    translation, which is all the comparison of catalogs needs. Obsolete
+    messages (`#~`) are ignored.
+
+    :param lines: Iterable with the lines of the file, a file object or a
+        StringIO buffer
+    :return: an ordered dictionary with the msgids and True if translated
+    """
+    from babel.messages.pofile import unescape
+
+    if hasattr(lines, 'getvalue'):
+        lines = lines.getvalue().splitlines()
+    messages = OrderedDict()
+    entry = {}
+    current = None
+
+    def flush():
+        if 'msgid' in entry:
+            messages[entry['msgid']] = any(
+                v for k, v in entry.items() if k.startswith('msgstr')
+            )
+        entry.clear()
+
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', 'replace')
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith('#'):
+            # Comments and flags come before a new message
+            if any(k.startswith('msgstr') for k in entry):
+                flush()
+            current = None
+            continue
+        if line.startswith('"'):
+            if current is not None:
+                entry[current] += unescape(line)
+            continue
+        match = PO_KEYWORD_RE.match(line)
+        if not match:
+            current = None
+            continue
+        keyword, string = match.groups()
+        if keyword in ('msgctxt', 'msgid') and \
+                any(k.startswith('msgstr') for k in entry):
+            flush()
+        current = keyword
+        entry[keyword] = unescape(string)
+    flush()
+    return messages
+
+
+def load_po(po_path):
+    """Messages of a po/pot file, cached by path, mtime and size
+
+    :param po_path: po/pot path
+    :return: the messages as returned by :func:`scan_po`
     """
-    :param pathA: path to pot/po file
-    :param pathB: path to pot/po file
-    :param translate: whether translation should be checked or not
-    :return: True if all strings in pathA are in pathB
+    stat = os.stat(po_path)
+    key = (stat.st_mtime, stat.st_size)
+    cached = _PO_MESSAGES_CACHE.get(po_path)
+    if cached is None or cached[0] != key:
+        with io.open(po_path, 'r', encoding='utf-8', errors='replace') as po:
+            cached = (key, scan_po(po))
+        _PO_MESSAGES_CACHE[po_path] = cached
+    return cached[1]
+
+
+def compare_po_messages(messagesA, messagesB):
+    """Compare the messages of two catalogs
+
+    :param messagesA: messages as returned by :func:`scan_po`
+    :param messagesB: messages as returned by :func:`scan_po`
+    :return: a tuple with the msgids of A missing and untranslated in B
     """
-    from os.path import isfile
-    import logging
-    logger = logging.getLogger('destral.utils.compare_pofiles')
-    if not isfile(pathA):
-        logger.info('Could not get po/pot file: {}'.format(pathA))
-        return None, None
-    elif not isfile(pathB):
-        logger.info('Could not get po/pot file: {}'.format(pathB))
-        return None, None
-    fileA = read_po(pathA)
-    fileB = read_po(pathB)
     not_found = []
     not_translated = []
-    for msgA in fileA:
-        if msgA.id == '':
-            continue
-        msgB = fileB.get(msgA.id)
-        if not msgB:
-            not_found.append(msgA.id)
+    for msgid in messagesA:
+        if msgid == '':
             continue
-        if not msgB.string:
-            not_translated.append(msgA.id)
+        translated = messagesB.get(msgid)
+        if translated is None:
+            not_found.append(msgid)
+        elif not translated:
+            not_translated.append(msgid)
     return not_found, not_translated
 
 
+def compare_pofiles(pathA, pathB):
+    """
+    :param pathA: path to pot/po file, a file object or StringIO buffer with
+        its contents or its messages from :func:`scan_po`
+    :param pathB: same as pathA
+    :return: a tuple with the strings of pathA missing in pathB and the ones
+        untranslated in pathB, or (None, None) if a file doesn't exist
+    """
+    from os.path import isfile
+    import logging
+    logger = logging.getLogger('destral.utils.compare_pofiles')
+    catalogs = []
+    for path in (pathA, pathB):
+        if isinstance(path, dict):
+            catalogs.append(path)
+        elif hasattr(path, 'read'):
+            catalogs.append(scan_po(path))
+        elif not isfile(path):
+            logger.info('Could not get po/pot file: {}'.format(path))
+            return None, None
+        else:
+            catalogs.append(load_po(path))
+    return compare_po_messages(*catalogs)
+
+
 class TempDir(object):
     def __init__(self):
         self.dir = tempfile.mkdtemp()
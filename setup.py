@@ -36,7 +36,8 @@ setup(
     author_email='devel@gisce.net',
     entry_points={
         'console_scripts': [
-            'destral = destral.cli:destral'
+            'destral = destral.cli:destral',
+            'destral-stats = destral.cli:stats'
         ]
     },
     description='OpenERP testing framework'
@@ -0,0 +1,81 @@
+# coding=utf-8
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from destral import cover
+
+try:
+    from coverage.tracer import CTracer
+except ImportError:
+    CTracer = None
+
+
+class UseFastCoreTests(unittest.TestCase):
+
+    def setUp(self):
+        self.environ = mock.patch.dict(os.environ)
+        self.environ.start()
+        self.addCleanup(self.environ.stop)
+
+    def test_sysmon_on_new_pythons(self):
+        with mock.patch.object(cover.sys, 'version_info', (3, 12, 0)):
+            self.assertEqual(cover.use_fast_core(), 'sysmon')
+        self.assertEqual(os.environ['COVERAGE_CORE'], 'sysmon')
+
+    @unittest.skipIf(CTracer is None, 'Coverage C tracer not available')
+    def test_c_tracer_with_dynamic_contexts(self):
+        with mock.patch.object(cover.sys, 'version_info', (3, 12, 0)):
+            self.assertEqual(
+                cover.use_fast_core(dynamic_contexts=True), 'ctrace'
+            )
+        self.assertEqual(os.environ['COVERAGE_CORE'], 'ctrace')
+
+    def test_python_tracer_without_the_c_tracer(self):
+        os.environ.pop('COVERAGE_CORE', None)
+        with mock.patch.object(cover.sys, 'version_info', (3, 11, 0)):
+            with mock.patch.dict('sys.modules', {'coverage.tracer': None}):
+                self.assertIsNone(cover.use_fast_core())
+        self.assertNotIn('COVERAGE_CORE', os.environ)
+
+
+class CombineRunTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.data_file = os.path.join(self.directory, '.coverage')
+
+    def write_data(self, suffix):
+        coverage = cover.OOCoverage(
+            data_file=self.data_file, data_suffix=suffix
+        )
+        coverage.start()
+        os.path.join('a', 'b')
+        coverage.stop()
+        coverage.save()
+
+    def test_only_the_files_of_the_run_are_combined(self):
+        self.write_data(cover.run_data_suffix('destral-1-1', 'stale'))
+        self.write_data(cover.run_data_suffix('destral-2-2', 'module_a'))
+        self.write_data(cover.run_data_suffix('destral-2-2', 'module_b'))
+
+        coverage = cover.OOCoverage(data_file=self.data_file)
+        coverage.combine_run('destral-2-2')
+
+        self.assertEqual(sorted(os.listdir(self.directory)), [
+            '.coverage', '.coverage.destral-1-1.stale'
+        ])
+
+    def test_nothing_to_combine(self):
+        coverage = cover.OOCoverage(data_file=self.data_file)
+        coverage.combine_run('destral-2-2')
+
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+# coding=utf-8
+import os
+import unittest
+
+from destral.forkserver import ForkServer
+
+STATE = {}
+
+
+def touch_state(key):
+    STATE[key] = os.getpid()
+    return sorted(STATE)
+
+
+class ForkServerTests(unittest.TestCase):
+
+    def setUp(self):
+        STATE.clear()
+        STATE['parent'] = os.getpid()
+        self.forkserver = ForkServer()
+
+    def test_child_result_and_clean_state(self):
+        self.assertEqual(
+            self.forkserver.run(touch_state, 'module_a'),
+            ['module_a', 'parent']
+        )
+        # Every child starts from the state of the parent
+        self.assertEqual(
+            self.forkserver.run(touch_state, key='module_b'),
+            ['module_b', 'parent']
+        )
+        self.assertEqual(STATE, {'parent': os.getpid()})
+
+    def test_child_runs_in_another_process(self):
+        self.assertNotEqual(self.forkserver.run(os.getpid), os.getpid())
+
+    def test_pid_of_the_last_child(self):
+        pid = self.forkserver.run(os.getpid)
+        self.assertEqual(self.forkserver.pid, pid)
+
+        with self.assertRaises(RuntimeError):
+            self.forkserver.run(os._exit, 3)
+        self.assertNotIn(self.forkserver.pid, (None, pid))
+
+    def test_error_in_child(self):
+        with self.assertRaises(RuntimeError) as context:
+            self.forkserver.run(int, 'not a number')
+        self.assertIn('ValueError', str(context.exception))
+
+    def test_child_died_without_result(self):
+        with self.assertRaises(RuntimeError):
+            self.forkserver.run(os._exit, 3)
+
+    def test_unpicklable_result(self):
+        with self.assertRaises(RuntimeError):
+            self.forkserver.run(lambda: lambda: None)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+# coding=utf-8
+import os
+import shutil
+import tempfile
+import unittest
+
+from destral.history import TimingHistory, load_durations
+from destral.scheduler import shard_modules, split_modules
+
+
+class TimingHistoryTests(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.cache_dir, 'history.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_estimate_is_the_mean_of_the_last_runs(self):
+        history = TimingHistory(self.path)
+        for total in (100, 10, 20, 30):
+            history.add_run({'module_a': {'total': total}})
+
+        self.assertEqual(history.estimate('module_a', last=3), 20)
+        self.assertEqual(history.estimate('module_b'), None)
+        self.assertEqual(history.estimate('module_b', default=1), 1)
+
+    def test_history_is_persisted(self):
+        history = TimingHistory(self.path)
+        history.add_run({'module_a': {'total': 5}}, date=1)
+        history.save()
+
+        history = TimingHistory(self.path)
+        self.assertEqual(history.durations('module_a'), [5])
+        self.assertEqual(history.runs[0]['date'], 1)
+
+    def test_only_the_last_runs_are_kept(self):
+        history = TimingHistory(self.path, max_runs=2)
+        for total in (1, 2, 3):
+            history.add_run({'module_a': {'total': total}})
+
+        self.assertEqual(history.durations('module_a'), [2, 3])
+
+    def test_slowest_modules_and_tests(self):
+        history = TimingHistory(self.path)
+        history.add_run({
+            'module_a': {'total': 10, 'unit': 8, 'tests': {'a.test_1': 6}},
+            'module_b': {'total': 30, 'unit': 25, 'tests': {'b.test_1': 1}},
+        }, phases={'lint': 3})
+        history.add_run({
+            'module_a': {'total': 20, 'unit': 18, 'tests': {'a.test_1': 8}},
+        })
+
+        self.assertEqual(
+            history.slowest_modules(), [('module_b', 30), ('module_a', 15)]
+        )
+        self.assertEqual(history.durations('module_a', 'unit'), [8, 18])
+        self.assertEqual(
+            history.slowest_tests(top=1), [('a.test_1', 7)]
+        )
+        self.assertEqual(history.runs[0]['phases'], {'lint': 3})
+
+    def test_export_and_load_durations(self):
+        history = TimingHistory(self.path)
+        history.add_run({
+            'module_a': {'total': 10, 'tests': {'a.test_1': 6}},
+            'module_b': {'unit': 25},
+        })
+        durations_path = os.path.join(self.cache_dir, 'durations.json')
+        history.export_durations(durations_path)
+
+        self.assertEqual(
+            load_durations(durations_path),
+            ({'module_a': 10}, {'a.test_1': 6})
+        )
+        with open(self.path, 'w') as f:
+            f.write('{"runs": []}')
+        self.assertRaises(ValueError, load_durations, self.path)
+
+    def test_shards_do_not_depend_on_the_node_history(self):
+        modules = ['base', 'module_a', 'module_b', 'module_c']
+        # Every node only has the timings of the modules it tested
+        node_1 = TimingHistory(os.path.join(self.cache_dir, 'node_1.json'))
+        node_1.add_run({'base': {'total': 1}, 'module_b': {'total': 50}})
+        node_2 = TimingHistory(os.path.join(self.cache_dir, 'node_2.json'))
+        node_2.add_run({'module_a': {'total': 3}, 'module_c': {'total': 90}})
+        self.assertNotEqual(
+            shard_modules(modules, 2, node_1.estimate)[0],
+            shard_modules(modules, 2, node_2.estimate)[0]
+        )
+
+        shared = TimingHistory(self.path)
+        shared.add_run({'base': {'total': 1}, 'module_a': {'total': 3},
+                        'module_b': {'total': 50}, 'module_c': {'total': 90}})
+        durations_path = os.path.join(self.cache_dir, 'durations.json')
+        shared.export_durations(durations_path)
+        durations = load_durations(durations_path)[0]
+        self.assertEqual(split_modules(modules, 2, durations)[0], [
+            ['module_c'], ['base', 'module_a', 'module_b']
+        ])
+        # Without a durations file the modules are split by name
+        self.assertEqual(split_modules(modules, 2)[0], [
+            ['base', 'module_b'], ['module_a', 'module_c']
+        ])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+# coding=utf-8
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from coverage import Coverage
+
+from destral.impact import ImpactMap, parse_diff_lines
+from destral.impact import coverage_test_context
+
+MODEL = '''def add(a, b):
+    return a + b
+
+
+def sub(a, b):
+    return a - b
+'''
+
+
+class ParseDiffLinesTests(unittest.TestCase):
+
+    def test_old_side_lines(self):
+        diff = '\n'.join([
+            'diff --git a/model.py b/model.py',
+            'index 1..2 100644',
+            '--- a/model.py',
+            '+++ b/model.py',
+            '@@ -2 +2 @@ def add(a, b):',
+            '-    return a + b',
+            '+    return b + a',
+            '@@ -4,0 +5,2 @@',
+            '+',
+            '+# Comment',
+            '@@ -7,2 +9 @@',
+            '--- removed SQL comment',
+            '-x',
+            '+y',
+            'diff --git a/new.py b/new.py',
+            'new file mode 100644',
+            '--- /dev/null',
+            '+++ b/new.py',
+            '@@ -0,0 +1 @@',
+            '+print(1)',
+        ])
+
+        self.assertEqual(parse_diff_lines(diff), {
+            'model.py': set([2, 4, 5, 7, 8]),
+            'new.py': set([0, 1]),
+        })
+
+
+class ImpactMapTests(unittest.TestCase):
+
+    def setUp(self):
+        self.module_dir = tempfile.mkdtemp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.cache_dir, 'impact-module_a.json')
+        self.model_path = os.path.join(self.module_dir, 'model.py')
+        with open(self.model_path, 'w') as model:
+            model.write(MODEL)
+        for command in (['init', '-q'], ['add', '.'],
+                        ['-c', 'user.name=destral',
+                         '-c', 'user.email=destral@example.com',
+                         'commit', '-q', '-m', 'Initial']):
+            subprocess.check_call(['git'] + command, cwd=self.module_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.module_dir)
+        shutil.rmtree(self.cache_dir)
+
+    def record(self):
+        coverage = Coverage(data_file=None, source=[self.module_dir])
+        coverage.start()
+        sys.path.insert(0, self.module_dir)
+        try:
+            import model
+        finally:
+            sys.path.pop(0)
+            sys.modules.pop('model', None)
+        coverage.switch_context(
+            coverage_test_context('module_a', 'tests.test_add')
+        )
+        model.add(1, 2)
+        coverage.switch_context(
+            coverage_test_context('module_b', 'tests.test_sub')
+        )
+        model.sub(1, 2)
+        coverage.switch_context('')
+        coverage.stop()
+        impact = ImpactMap('module_a', self.path)
+        commit = ImpactMap.clean_commit(self.module_dir)
+        impact.record(coverage.get_data(), self.module_dir, commit)
+        impact.save()
+        return ImpactMap('module_a', self.path)
+
+    def edit(self, old, new):
+        with open(self.model_path, 'w') as model:
+            model.write(MODEL.replace(old, new))
+
+    def test_record_the_lines_of_every_test(self):
+        impact = self.record()
+
+        self.assertEqual(impact.tests, ['tests.test_add'])
+        lines = impact.files['model.py']
+        self.assertEqual(lines['1'], [-1])
+        self.assertEqual(lines['2'], [0])
+        self.assertEqual(lines['6'], [])
+
+    def test_select_the_tests_of_the_changed_lines(self):
+        impact = self.record()
+
+        self.edit('a + b', 'b + a')
+        self.assertEqual(
+            impact.select_tests(self.module_dir), set(['tests.test_add'])
+        )
+
+    def test_whole_suite_when_only_an_untested_line_changes(self):
+        impact = self.record()
+
+        # sub only runs in the tests of another module
+        self.edit('a - b', '-b + a')
+        self.assertIsNone(impact.select_tests(self.module_dir))
+
+    def test_whole_suite_without_changes(self):
+        # The module is tested for a change in its dependencies
+        impact = self.record()
+
+        self.assertIsNone(impact.select_tests(self.module_dir))
+
+    def test_whole_suite_when_the_change_is_not_mapped(self):
+        impact = self.record()
+
+        self.edit('def sub', 'def substract')
+        self.assertIsNone(impact.select_tests(self.module_dir))
+        self.edit('def sub', 'def sub')
+        with open(os.path.join(self.module_dir, 'view.xml'), 'w') as view:
+            view.write('<openerp/>')
+        self.assertIsNone(impact.select_tests(self.module_dir))
+
+    def test_no_map_and_stale_map(self):
+        impact = ImpactMap('module_a', self.path)
+        self.assertIsNone(impact.select_tests(self.module_dir))
+
+        impact.commit = 'f' * 40
+        self.assertIsNone(impact.select_tests(self.module_dir))
+
+    def test_dirty_checkout_has_no_clean_commit(self):
+        self.assertIsNotNone(ImpactMap.clean_commit(self.module_dir))
+        self.edit('a + b', 'b + a')
+        self.assertIsNone(ImpactMap.clean_commit(self.module_dir))
+
+
+if __name__ == '__main__':
+    unittest.main()
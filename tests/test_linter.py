@@ -0,0 +1,102 @@
+# coding=utf-8
+import os
+import shutil
+import tempfile
+import unittest
+
+import mock
+
+from destral import linter
+from destral.cli import get_lint_files
+
+
+class GetLintFilesTests(unittest.TestCase):
+
+    def setUp(self):
+        self.addons_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.addons_dir)
+        for path in ('module_a/model.py', 'module_a/view.xml',
+                     'module_a/wizard/wizard.py', 'module_b/model.py',
+                     'module_ab/model.py'):
+            self.write_file(path)
+
+    def write_file(self, path):
+        path = os.path.join(self.addons_dir, path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        open(path, 'w').close()
+
+    def path(self, path):
+        return os.path.join(self.addons_dir, path)
+
+    def test_changed_python_files_of_the_modules(self):
+        paths = [self.path(p) for p in (
+            'module_a/model.py', 'module_a/view.xml',
+            'module_a/wizard/wizard.py', 'module_b/model.py',
+            'module_ab/model.py', 'module_a/deleted.py',
+        )]
+
+        self.assertEqual(
+            get_lint_files(['module_a'], self.addons_dir, paths),
+            [self.path('module_a/model.py'),
+             self.path('module_a/wizard/wizard.py')]
+        )
+
+    def test_nothing_to_lint(self):
+        self.assertEqual(
+            get_lint_files(['module_a'], self.addons_dir, [
+                self.path('module_a/view.xml'), self.path('module_b/model.py')
+            ]),
+            []
+        )
+
+    def test_whole_modules_when_the_changes_are_unknown(self):
+        self.assertEqual(
+            get_lint_files(['module_a', 'module_b'], self.addons_dir),
+            [self.path('module_a'), self.path('module_b')]
+        )
+
+
+class RunLinterTests(unittest.TestCase):
+
+    def setUp(self):
+        self.linter_class = mock.patch.object(linter, 'PyLinter').start()
+        mock.patch.object(linter, 'ColorizedTextReporter').start()
+        mock.patch.object(linter, 'find_pylintrc').start()
+        self.addCleanup(mock.patch.stopall)
+        self.pylinter = self.linter_class.return_value
+
+    def test_lint_with_many_jobs(self):
+        linter.run_linter(['module_a'], jobs=4)
+
+        self.pylinter.set_option.assert_called_with('jobs', 4)
+        self.pylinter.check.assert_called_with(['module_a'])
+        self.assertTrue(self.pylinter.generate_reports.called)
+
+    def test_lint_with_one_job(self):
+        linter.run_linter(['module_a'])
+
+        self.assertFalse(self.pylinter.set_option.called)
+        self.pylinter.check.assert_called_with(['module_a'])
+
+    def test_nothing_to_lint(self):
+        linter.run_linter(None)
+
+        self.assertFalse(self.linter_class.called)
+
+    def test_start_linter_in_background(self):
+        with mock.patch.object(linter.multiprocessing, 'Process') as process:
+            self.assertIs(
+                linter.start_linter(['module_a'], jobs=2),
+                process.return_value
+            )
+
+        process.assert_called_with(
+            target=linter.run_linter, args=(['module_a'], 2),
+            name='destral-linter'
+        )
+        self.assertTrue(process.return_value.start.called)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+# coding=utf-8
+import unittest
+
+import mock
+
+from destral import openerp
+from destral.openerp import TEST_DATABASE_RE, cleanup_orphan_databases
+
+
+class TestDatabaseNameTests(unittest.TestCase):
+
+    def test_names_created_by_destral(self):
+        for name, created, pid in (
+            ('test_1700000000', '1700000000', None),
+            ('test_1700000000_4242', '1700000000', '4242'),
+        ):
+            self.assertEqual(
+                TEST_DATABASE_RE.match(name).groups(), (created, pid)
+            )
+
+    def test_other_databases(self):
+        for name in (
+            'test_1', 'test_2023', 'test_2023_01', 'test_17000000001',
+            'test_1700000000_', 'test_1700000000_copy', 'test_db',
+            'my_test_1700000000', 'destral_tpl_1700000000',
+        ):
+            self.assertIsNone(TEST_DATABASE_RE.match(name), name)
+
+
+class CleanupOrphanDatabasesTests(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1700100000
+        mock.patch.object(openerp.time, 'time', return_value=self.now).start()
+        self.sql_db = mock.Mock()
+        mock.patch.dict('sys.modules', {'sql_db': self.sql_db}).start()
+        self.addCleanup(mock.patch.stopall)
+        self.teardown = mock.Mock()
+
+    def cleanup(self, names, max_age=3600, pid=None, since=None):
+        cursor = self.sql_db.db_connect.return_value.cursor.return_value
+        cursor.fetchall.return_value = [(name, ) for name in names]
+        return cleanup_orphan_databases(
+            max_age, teardown=self.teardown, pid=pid, since=since
+        )
+
+    def test_drop_the_old_test_databases(self):
+        old = 'test_{}'.format(self.now - 7200)
+        old_worker = 'test_{}_123'.format(self.now - 3601)
+        recent = 'test_{}_123'.format(self.now - 60)
+
+        dropped = self.cleanup([old, old_worker, recent, 'test_2023'])
+
+        self.assertEqual(dropped, [old, old_worker])
+        self.assertEqual(
+            [c[0][0] for c in self.teardown.put.call_args_list],
+            [old, old_worker]
+        )
+        self.assertFalse(self.teardown.close.called)
+
+    def test_drop_the_databases_of_a_process(self):
+        of_child = 'test_{}_123'.format(self.now)
+
+        dropped = self.cleanup([
+            of_child, 'test_{}_1234'.format(self.now),
+            'test_{}'.format(self.now - 7200),
+            # Same pid in another container or run, before the child started
+            'test_{}_123'.format(self.now - 60),
+        ], max_age=0, pid=123, since=self.now - 10)
+
+        self.assertEqual(dropped, [of_child])
+
+    def test_nothing_to_drop(self):
+        self.assertEqual(
+            self.cleanup(['test_{}'.format(self.now), 'test_1']), []
+        )
+        self.assertFalse(self.teardown.put.called)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+# coding=utf-8
+import os
+import socket
+import unittest
+
+import mock
+
+from destral import pgcluster
+
+
+class FindFreePortTests(unittest.TestCase):
+
+    def test_port_can_be_bound(self):
+        port = pgcluster.find_free_port()
+
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.addCleanup(sock.close)
+        sock.bind(('127.0.0.1', port))
+
+
+class EphemeralClusterTests(unittest.TestCase):
+
+    def setUp(self):
+        patcher = mock.patch.object(
+            pgcluster, 'find_pg_binary', side_effect=lambda name: name
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.cluster = pgcluster.EphemeralCluster(user='destral')
+        self.addCleanup(self.cluster.stop)
+
+    @mock.patch.object(pgcluster.subprocess, 'check_call')
+    def test_start_creates_a_cluster_without_durability(self, check_call):
+        environ = self.cluster.start()
+
+        initdb, pg_ctl = [c[0][0] for c in check_call.call_args_list]
+        self.assertEqual(initdb[:5], [
+            'initdb', '-D', self.cluster.data_dir, '-U', 'destral'
+        ])
+        self.assertEqual(pg_ctl[:2], ['pg_ctl', 'start'])
+        options = pg_ctl[-1]
+        for setting in ("fsync='off'", "synchronous_commit='off'",
+                        "full_page_writes='off'"):
+            self.assertIn(setting, options)
+        self.assertIn("port='{}'".format(self.cluster.port), options)
+        self.assertEqual(environ, {
+            'OPENERP_DB_HOST': '127.0.0.1',
+            'OPENERP_DB_PORT': str(self.cluster.port),
+            'OPENERP_DB_USER': 'destral',
+        })
+
+    @mock.patch.object(pgcluster.subprocess, 'check_call')
+    def test_stop_removes_the_cluster(self, check_call):
+        self.cluster.start()
+        base_dir = self.cluster.base_dir
+        if os.access(pgcluster.SHM_DIR, os.W_OK):
+            self.assertTrue(base_dir.startswith(pgcluster.SHM_DIR))
+
+        self.cluster.stop()
+        self.assertFalse(os.path.exists(base_dir))
+        self.cluster.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
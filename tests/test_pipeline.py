@@ -0,0 +1,133 @@
+# coding=utf-8
+import os
+import unittest
+
+import mock
+
+from destral import pipeline
+from destral.pipeline import DatabasePipeline
+
+
+def _prepare_in_worker(module, tests=None):
+    if module == 'broken_module':
+        raise Exception('Install error')
+    demo = tests == ['DemoTests']
+    return 'test_{}_{}'.format(module, os.getpid()), {'install': 1}, demo
+
+
+class DatabasePipelineTests(unittest.TestCase):
+
+    def setUp(self):
+        mock.patch.object(
+            pipeline, 'prepare_database', _prepare_in_worker
+        ).start()
+        self.addCleanup(mock.patch.stopall)
+        self.pipeline = DatabasePipeline()
+        self.addCleanup(self.pipeline.pool.terminate)
+
+    def test_every_module_gets_a_new_worker(self):
+        self.pipeline.prepare('module_a')
+        self.pipeline.prepare('module_b')
+
+        db_a, timings, demo = self.pipeline.get('module_a')
+        db_b, _, _ = self.pipeline.get('module_b')
+
+        self.assertTrue(db_a.startswith('test_module_a_'))
+        self.assertEqual(timings, {'install': 1})
+        self.assertFalse(demo)
+        worker_a, worker_b = db_a.split('_')[-1], db_b.split('_')[-1]
+        self.assertNotEqual(worker_a, worker_b)
+        self.assertNotEqual(worker_a, str(os.getpid()))
+
+    def test_prepare_for_the_tests_to_run(self):
+        self.pipeline.prepare('module_a', ['DemoTests'])
+
+        self.assertTrue(self.pipeline.get('module_a')[2])
+
+    def test_base_and_unknown_modules(self):
+        self.pipeline.prepare('base')
+
+        self.assertEqual(self.pipeline.pending, {})
+        self.assertEqual(self.pipeline.get('base'), (None, {}, False))
+
+    def test_error_preparing_a_module(self):
+        self.pipeline.prepare('broken_module')
+
+        self.assertEqual(
+            self.pipeline.get('broken_module'), (None, {}, False)
+        )
+
+    def test_close_drops_the_unused_databases(self):
+        self.pipeline.prepare('module_a')
+        with mock.patch.object(self.pipeline, 'drop') as drop:
+            self.pipeline.close()
+
+        db_name = drop.call_args[0][0]
+        self.assertTrue(db_name.startswith('test_module_a_'))
+        self.assertEqual(self.pipeline.pending, {})
+
+
+class PrepareDatabaseTests(unittest.TestCase):
+
+    def setUp(self):
+        from destral import testing
+        self.suite = mock.Mock(config={}, openerp=mock.Mock(config={}))
+        self.get_suite = mock.patch.object(
+            testing, 'get_unittest_suite', return_value=self.suite
+        ).start()
+        self.create = mock.patch.object(
+            testing, 'create_module_database', return_value='test_1700000000'
+        ).start()
+        self.sql_db = mock.Mock()
+        self.sql_db._Pool._connections = ['Inherited connection']
+        mock.patch.dict('sys.modules', {'sql_db': self.sql_db}).start()
+        mock.patch.dict(os.environ).start()
+        self.addCleanup(mock.patch.stopall)
+
+    def test_demo_data_of_the_first_group(self):
+        for groups, demo in (
+            ([(False, ['test_a']), (True, ['test_b'])], False),
+            ([(True, ['test_b'])], True),
+            ([], False),
+        ):
+            self.suite.demo_groups.return_value = groups
+
+            db_name, timings, prepared_demo = pipeline.prepare_database(
+                'module_a', ['DemoTests']
+            )
+
+            self.assertEqual(db_name, 'test_1700000000')
+            self.assertEqual(
+                sorted(timings), ['create_database', 'install']
+            )
+            self.assertEqual(prepared_demo, demo)
+            self.create.assert_called_with(
+                self.suite.openerp, self.suite.config, demo
+            )
+            self.assertEqual(
+                self.suite.openerp.config['without_demo'], not demo
+            )
+        self.get_suite.assert_called_with('module_a', ['DemoTests'])
+        self.suite.openerp.install_module.assert_called_with(
+            'module_a', with_test_depends=True
+        )
+
+    def test_inherited_connections_are_not_used(self):
+        self.suite.demo_groups.return_value = []
+
+        pipeline.prepare_database('module_a')
+
+        self.assertEqual(self.sql_db._Pool._connections, [])
+
+    def test_drop_without_the_inherited_connections(self):
+        with mock.patch('destral.openerp.OpenERPService') as service:
+            pipeline.drop_database('test_1700000000')
+
+        self.assertEqual(self.sql_db._Pool._connections, [])
+        service.return_value.drop_database.assert_called_with(
+            'test_1700000000'
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+# coding=utf-8
+import os
+import time
+import unittest
+
+from destral import scheduler
+
+
+def _square_with_pid(value):
+    return value * value, os.getpid()
+
+
+def _sleep_and_time(seconds):
+    start = time.time()
+    time.sleep(seconds)
+    return seconds, start, time.time()
+
+
+class RunInPoolTests(unittest.TestCase):
+
+    def test_results_keep_the_order_of_the_items(self):
+        results = scheduler.run_in_pool(_square_with_pid, [3, 1, 2], 2)
+
+        self.assertEqual([r[0] for r in results], [9, 1, 4])
+
+    def test_every_item_runs_in_a_fresh_process(self):
+        results = scheduler.run_in_pool(_square_with_pid, [1, 2, 3], 1)
+
+        pids = set(r[1] for r in results)
+        self.assertEqual(len(pids), 3)
+        self.assertNotIn(os.getpid(), pids)
+
+    def test_no_items(self):
+        self.assertEqual(scheduler.run_in_pool(_square_with_pid, [], 4), [])
+
+    def test_items_start_after_their_dependencies(self):
+        results = scheduler.run_in_pool(
+            _sleep_and_time, [0.3, 0, 0], 3, after=[[], [0], [1]]
+        )
+
+        self.assertEqual([r[0] for r in results], [0.3, 0, 0])
+        self.assertGreaterEqual(results[1][1], results[0][2])
+        self.assertGreaterEqual(results[2][1], results[1][2])
+
+    def test_dependency_cycles_are_ignored(self):
+        results = scheduler.run_in_pool(
+            _square_with_pid, [2, 3], 2, after=[[1], [0]]
+        )
+
+        self.assertEqual([r[0] for r in results], [4, 9])
+
+
+class ShardModulesTests(unittest.TestCase):
+
+    DURATIONS = {'base': 1, 'module_a': 40, 'module_b': 5, 'module_c': 30,
+                 'module_d': 10}
+
+    def test_longest_first_balances_the_shards(self):
+        modules = ['base', 'module_a', 'module_b', 'module_c', 'module_d']
+
+        shards, loads = scheduler.shard_modules(
+            modules, 2, self.DURATIONS.get
+        )
+
+        self.assertEqual(shards, [
+            ['module_a', 'module_b'], ['base', 'module_c', 'module_d']
+        ])
+        self.assertEqual(loads, [45, 41])
+
+    def test_unknown_modules_use_the_mean(self):
+        shards, loads = scheduler.shard_modules(
+            ['module_a', 'module_x', 'module_y'], 2,
+            {'module_a': 10}.get
+        )
+
+        self.assertEqual(shards, [['module_a', 'module_y'], ['module_x']])
+        self.assertEqual(loads, [20, 10])
+
+    def test_more_shards_than_modules(self):
+        shards, loads = scheduler.shard_modules(['base'], 3, lambda m: None)
+
+        self.assertEqual(shards, [['base'], [], []])
+
+    def test_parse_shard(self):
+        self.assertEqual(scheduler.parse_shard('2/4'), (2, 4))
+        for value in ('0/4', '5/4', '1', 'a/b', '1/0'):
+            self.assertRaises(ValueError, scheduler.parse_shard, value)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+# coding=utf-8
+import os
+import shutil
+import tempfile
+import unittest
+
+from destral import templates
+
+
+class TemplateKeyTests(unittest.TestCase):
+
+    def setUp(self):
+        self.addons_dir = tempfile.mkdtemp()
+        self.write_module('base', [])
+        self.write_module('module_a', ['base'], data=['module_a_view.xml'])
+        self.write_module('module_b', ['module_a'])
+        self.write_file('module_a', 'module_a_view.xml', '<openerp/>')
+        self.write_file('module_a', 'model.py', 'x = 1\n')
+        self.write_file('module_a', 'wizard/wizard.py', 'y = 1\n')
+        self.write_file('module_a', 'README.md', 'Docs\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.addons_dir)
+
+    def write_module(self, module_name, deps, data=None):
+        self.write_file(module_name, '__terp__.py', "{}\n".format({
+            'name': module_name, 'depends': deps, 'update_xml': data or []
+        }))
+
+    def write_file(self, module_name, path, content):
+        path = os.path.join(self.addons_dir, module_name, path)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def key(self, module='module_b', demo=True):
+        return templates.template_key(module, self.addons_dir, demo)
+
+    def test_module_files(self):
+        self.assertEqual(
+            templates.module_files('module_a', self.addons_dir), [
+                os.path.join('module_a', '__terp__.py'),
+                os.path.join('module_a', 'model.py'),
+                os.path.join('module_a', 'module_a_view.xml'),
+                os.path.join('module_a', 'wizard', 'wizard.py'),
+            ]
+        )
+
+    def test_key_changes_with_the_dependency_files(self):
+        key = self.key()
+        self.assertEqual(self.key(), key)
+
+        self.write_file('module_a', 'README.md', 'Other docs\n')
+        self.assertEqual(self.key(), key)
+
+        self.write_file('module_a', 'module_a_view.xml', '<openerp></openerp>')
+        self.assertNotEqual(self.key(), key)
+
+    def test_key_ignores_the_module_to_test(self):
+        key = self.key()
+
+        self.write_file('module_b', 'model.py', 'z = 1\n')
+        self.assertEqual(self.key(), key)
+
+    def test_key_depends_on_the_demo_data(self):
+        self.assertNotEqual(self.key(demo=False), self.key())
+
+    def test_build_names(self):
+        key = 'a' * templates.KEY_LENGTH
+        build = templates.BUILD_NAME_RE.match(
+            '{}{}_1234'.format(templates.TEMPLATE_PREFIX, key)
+        )
+
+        self.assertEqual(build.group(1), '1234')
+        self.assertIsNone(templates.BUILD_NAME_RE.match(
+            templates.TEMPLATE_PREFIX + key
+        ))
+
+    def test_pid_alive(self):
+        self.assertTrue(templates.pid_alive(os.getpid()))
+
+
+if __name__ == '__main__':
+    unittest.main()
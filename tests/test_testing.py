@@ -0,0 +1,365 @@
+# coding=utf-8
+import os
+import sys
+import unittest
+
+import mock
+
+from destral import testing
+
+
+class SavepointTests(unittest.TestCase):
+
+    def setUp(self):
+        transaction = mock.patch.object(testing, 'Transaction').start()
+        self.ws_info = mock.patch.object(testing, '_ws_info').start()
+        mock.patch.object(testing, 'WebServiceTracker').start()
+        self.addCleanup(mock.patch.stopall)
+        self.txn = transaction.return_value.start.return_value
+
+        class SavepointCase(testing.OOTestCaseWithCursor):
+            use_savepoints = True
+            openerp = mock.Mock(db_name='test_1700000000')
+            class_txn = self.txn
+
+            def test_savepoint(self):
+                pass
+
+        self.test_class = SavepointCase
+        self.test = SavepointCase('test_savepoint')
+
+    def test_every_test_rolls_back_its_savepoint(self):
+        self.test.setUp()
+        self.test.tearDown()
+
+        queries = [c[0][0] for c in self.txn.cursor.execute.call_args_list]
+        self.assertEqual(queries, [
+            'SAVEPOINT destral_test',
+            'ROLLBACK TO SAVEPOINT destral_test; '
+            'RELEASE SAVEPOINT destral_test'
+        ])
+        self.assertIs(self.test_class.class_txn, self.txn)
+        self.assertFalse(self.txn.stop.called)
+
+    def test_lost_savepoint_fails_and_restarts_the_class_transaction(self):
+        self.test.setUp()
+        self.txn.cursor.execute.side_effect = Exception(
+            'savepoint "destral_test" does not exist'
+        )
+
+        with self.assertRaises(AssertionError):
+            self.test.tearDown()
+        self.assertTrue(self.txn.stop.called)
+        testing.Transaction.return_value.start.assert_called_with(
+            'test_1700000000'
+        )
+        self.assertTrue(self.ws_info.pop.called)
+
+
+class ShardSuiteTests(unittest.TestCase):
+
+    def setUp(self):
+        mock.patch.object(testing, 'OOTestSuite', unittest.TestSuite).start()
+        self.addCleanup(mock.patch.stopall)
+
+        class ShardedCase(unittest.TestCase):
+            pass
+
+        for i in range(10):
+            setattr(ShardedCase, 'test_{}'.format(i), lambda self: None)
+        self.suite = unittest.TestSuite([
+            unittest.TestSuite([ShardedCase('test_{}'.format(i)) for i in
+                                range(5)]),
+            unittest.TestSuite([ShardedCase('test_{}'.format(i)) for i in
+                                range(5, 10)]),
+        ])
+        self.ids = [t.id() for t in testing.iter_suite_tests(self.suite)]
+
+    def partitions(self, total, durations=None):
+        return [
+            [t.id() for t in testing.shard_suite(
+                self.suite, index, total, durations
+            )]
+            for index in range(1, total + 1)
+        ]
+
+    def assertRunsEveryTestOnce(self, partitions):
+        run = sum(partitions, [])
+        self.assertEqual(sorted(run), sorted(self.ids))
+        for partition in partitions:
+            # The tests keep the order of the suite
+            self.assertEqual(
+                partition, [i for i in self.ids if i in partition]
+            )
+
+    def test_partition_by_hash(self):
+        partitions = self.partitions(3)
+
+        self.assertRunsEveryTestOnce(partitions)
+        self.assertEqual(self.partitions(3), partitions)
+
+    def test_partition_by_durations(self):
+        durations = dict((test_id, 1) for test_id in self.ids)
+        durations[self.ids[0]] = 9
+
+        partitions = self.partitions(2, durations)
+
+        self.assertRunsEveryTestOnce(partitions)
+        self.assertEqual(partitions[0], [self.ids[0]])
+
+    def test_tests_without_duration(self):
+        # Unknown tests count as the mean of the known ones
+        durations = {self.ids[0]: 4, self.ids[1]: 2}
+
+        partitions = self.partitions(3, durations)
+
+        self.assertRunsEveryTestOnce(partitions)
+        self.assertEqual(
+            [len(p) for p in partitions], [3, 4, 3]
+        )
+
+
+class SkipViewValidation(Exception):
+    pass
+
+
+class FakeModel(object):
+    """Model of the fake pool, returning its records by id."""
+
+    def __init__(self, records=None, search_ids=None):
+        self.records = dict((r['id'], r) for r in records or [])
+        self.search_ids = search_ids or []
+        self.searches = []
+
+    def search(self, cursor, uid, args):
+        self.searches.append(args)
+        return self.search_ids
+
+    def read(self, cursor, uid, ids, fields):
+        return [self.records[i] for i in ids]
+
+
+class FakeViewModel(object):
+
+    def __init__(self, skip=()):
+        self.skip = skip
+        self.validated = []
+
+    def fields_view_get(self, cursor, uid, view_id, view_type, version=None):
+        self.validated.append((view_id, version))
+        if view_id in self.skip:
+            raise SkipViewValidation('Not for this version')
+
+
+class BaseTestsCase(unittest.TestCase):
+
+    def setUp(self):
+        transaction = mock.patch.object(testing, 'Transaction').start()
+        self.addCleanup(mock.patch.stopall)
+        txn = transaction.return_value.start.return_value.__enter__
+        txn.return_value = mock.Mock(user=1)
+        self.pool = {}
+        openerp = mock.Mock(db_name='test_1700000000')
+        openerp.pool.get.side_effect = self.pool.get
+        self.test_class = type('BaseTests', (testing.OOBaseTests, ), {
+            'openerp': openerp, 'config': {'module': 'module_a'}
+        })
+
+    def run_base_test(self, name):
+        getattr(self.test_class(name), name)()
+
+
+class AllViewsTests(BaseTestsCase):
+
+    def setUp(self):
+        super(AllViewsTests, self).setUp()
+        tools = mock.Mock()
+        tools.TestingExceptions.SkipViewValidation = SkipViewValidation
+        mock.patch.dict(sys.modules, {'tools': tools}).start()
+        views = [
+            (1, False, 1),
+            (2, 1, 1),
+            (3, 1, 1),
+            (4, 2, 1),
+            (5, False, 2),
+        ]
+        self.pool['ir.model.data'] = FakeModel([
+            {'id': 10 + i, 'module': 'module_a', 'name': 'view_{}'.format(i),
+             'res_id': i}
+            for i, _, _ in views
+        ], search_ids=[10 + i for i, _, _ in views])
+        self.pool['ir.ui.view'] = FakeModel([
+            {'id': i, 'name': 'view_{}'.format(i), 'model': 'res.partner',
+             'type': 'form', 'version': version,
+             'inherit_id': parent and [parent, 'view_{}'.format(parent)]}
+            for i, parent, version in views
+        ])
+        self.model = FakeViewModel(skip=(5, ))
+        self.pool['res.partner'] = self.model
+
+    def test_every_view_version_is_validated_once(self):
+        self.run_base_test('test_all_views')
+
+        # The parent views are not validated again for every child
+        self.assertEqual(self.model.validated, [
+            (1, 1),
+            (2, 1), (2, None),
+            (3, 1), (3, None),
+            (4, 1), (4, None),
+            (5, 2),
+        ])
+
+    def test_views_of_the_module(self):
+        self.run_base_test('test_all_views')
+
+        self.assertEqual(self.pool['ir.model.data'].searches, [
+            [('model', '=', 'ir.ui.view'), ('module', '=', 'module_a')]
+        ])
+
+    def test_view_of_a_missing_model(self):
+        del self.pool['res.partner']
+
+        with self.assertRaises(Exception) as context:
+            self.run_base_test('test_all_views')
+        self.assertIn('module_a.view_1', str(context.exception))
+
+
+class AccessRulesTests(BaseTestsCase):
+
+    def setUp(self):
+        super(AccessRulesTests, self).setUp()
+        self.pool['ir.model.data'] = FakeModel([
+            {'id': 11, 'name': 'model_res_partner', 'res_id': 1},
+            {'id': 12, 'name': 'model_res_partner_address', 'res_id': 2},
+            {'id': 13, 'name': 'model_test_model', 'res_id': 3},
+        ], search_ids=[11, 12, 13])
+        self.pool['ir.model'] = FakeModel([
+            {'id': 1, 'model': 'res.partner'},
+            {'id': 2, 'model': 'res.partner.address'},
+            {'id': 3, 'model': 'test.model'},
+        ])
+        self.pool['ir.model.access'] = FakeModel([
+            {'id': 21, 'model_id': [1, 'res.partner']},
+        ], search_ids=[21])
+        self.pool['res.partner'] = mock.Mock(_test_class=False)
+        self.pool['res.partner.address'] = mock.Mock(_test_class=False)
+        self.pool['test.model'] = mock.Mock(_test_class=True)
+
+    def test_models_without_access_rules(self):
+        with self.assertRaises(AssertionError) as context:
+            self.run_base_test('test_access_rules')
+
+        self.assertEqual(
+            str(context.exception),
+            "Models: res.partner.address doesn't have any access rules "
+            "defined"
+        )
+        self.assertEqual(self.pool['ir.model.access'].searches, [
+            [('model_id', 'in', [1, 2, 3])]
+        ])
+
+    def test_models_with_access_rules(self):
+        self.pool['ir.model.access'] = FakeModel([
+            {'id': 21, 'model_id': [1, 'res.partner']},
+            {'id': 22, 'model_id': [2, 'res.partner.address']},
+        ], search_ids=[21, 22])
+
+        self.run_base_test('test_access_rules')
+
+
+class SelectSuiteTests(unittest.TestCase):
+
+    def test_base_tests_are_always_kept(self):
+        class SelectedCase(unittest.TestCase):
+            def test_selected(self):
+                pass
+
+            def test_other(self):
+                pass
+
+        selected = SelectedCase('test_selected')
+        base = testing.OOBaseTests('test_all_views')
+        suite = unittest.TestSuite([
+            selected, SelectedCase('test_other'), base
+        ])
+
+        with mock.patch.object(testing, 'OOTestSuite', unittest.TestSuite):
+            self.assertEqual(
+                list(testing.select_suite(suite, set([selected.id()]))),
+                [selected, base]
+            )
+
+
+class DemoGroupsTests(unittest.TestCase):
+
+    def setUp(self):
+        mock.patch.object(testing, 'OpenERPService').start()
+        self.environ = mock.patch.dict(os.environ, {
+            'DESTRAL_MODULE': 'module_a'
+        })
+        self.environ.start()
+        self.addCleanup(mock.patch.stopall)
+
+        class LeanCase(unittest.TestCase):
+            def test_lean(self):
+                pass
+
+        class DemoCase(unittest.TestCase):
+            require_demo_data = True
+
+            def test_demo(self):
+                pass
+
+        self.lean = LeanCase('test_lean')
+        self.demo = DemoCase('test_demo')
+
+    def test_lean_tests_first(self):
+        suite = testing.OOTestSuite([self.demo, self.lean])
+
+        self.assertEqual(suite.demo_groups(), [
+            (False, [self.lean]), (True, [self.demo])
+        ])
+
+    def test_only_demo_tests(self):
+        suite = testing.OOTestSuite([self.demo])
+
+        self.assertEqual(suite.demo_groups(), [(True, [self.demo])])
+        self.assertEqual(testing.OOTestSuite().demo_groups(), [])
+
+    def test_always_demo(self):
+        os.environ['DESTRAL_ALWAYS_DEMO'] = 'True'
+        suite = testing.OOTestSuite([self.demo, self.lean])
+
+        self.assertEqual(suite.demo_groups(), [
+            (True, [self.demo, self.lean])
+        ])
+
+    def test_every_group_runs_in_its_own_suite(self):
+        suite = testing.OOTestSuite([self.demo, self.lean])
+        suite.prepared_database = 'test_1700000000'
+        suite.prepared_demo = True
+        result = unittest.TestResult()
+        runs = []
+
+        def run(group_suite, group_result, debug=False):
+            runs.append((
+                list(group_suite), group_suite.prepared_database,
+                group_result._previousTestClass
+            ))
+            group_result._previousTestClass = type(list(group_suite)[0])
+            group_suite.timings['unit'] = 1
+
+        with mock.patch.object(testing.OOTestSuite, 'run', run):
+            suite._run_demo_groups(suite.demo_groups(), result, False)
+
+        # The previous class of the other group is not torn down again
+        self.assertEqual(runs, [
+            ([self.lean], None, None),
+            ([self.demo], 'test_1700000000', None),
+        ])
+        self.assertEqual(suite.timings, {'unit': 2})
+        self.assertIsNone(suite.prepared_database)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+# coding=utf-8
+import unittest
+
+import mock
+
+from destral import transaction
+from destral.transaction import CONTEXT_WRITE_RE, Transaction
+
+
+class ContextWriteTests(unittest.TestCase):
+
+    def test_writes_to_users_and_languages(self):
+        for query in (
+            'INSERT INTO res_users (login) VALUES (%s)',
+            'UPDATE "res_users" SET context_lang = %s WHERE id = %s',
+            '  update res_lang set active = True',
+            'DELETE FROM res_lang WHERE id IN %s',
+            'delete from "res_users" where id = 5',
+        ):
+            self.assertTrue(CONTEXT_WRITE_RE.search(query), query)
+
+    def test_reads_and_other_tables_are_ignored(self):
+        for query in (
+            'SELECT context_lang FROM res_users WHERE id = %s',
+            'SELECT id FROM res_lang WHERE code = %s',
+            'UPDATE res_partner SET lang = %s',
+            'INSERT INTO res_users_log (user_id) VALUES (%s)',
+            'UPDATE res_lang_translation SET value = %s',
+            'SELECT * FROM res_users FOR UPDATE',
+        ):
+            self.assertFalse(CONTEXT_WRITE_RE.search(query), query)
+
+
+class InvalidateContextTests(unittest.TestCase):
+
+    def setUp(self):
+        cache = mock.patch.dict(Transaction._context_cache, clear=True)
+        cache.start()
+        self.addCleanup(cache.stop)
+        Transaction._context_cache[('test_db', 1)] = {'lang': 'ca_ES'}
+        Transaction._context_cache[('other_db', 1)] = {'lang': 'es_ES'}
+
+    def test_write_invalidates_the_cache(self):
+        transaction.invalidate_context_on_write(
+            mock.Mock(), sql='UPDATE res_users SET context_lang = %s'
+        )
+
+        self.assertEqual(Transaction._context_cache, {})
+
+    def test_read_keeps_the_cache(self):
+        transaction.invalidate_context_on_write(
+            mock.Mock(), 'SELECT context_lang FROM res_users'
+        )
+
+        self.assertEqual(len(Transaction._context_cache), 2)
+
+    def test_clear_a_database(self):
+        Transaction.clear_context_cache('test_db')
+
+        self.assertEqual(list(Transaction._context_cache), [('other_db', 1)])
+
+    def test_cursor_execute_signal_invalidates_the_cache(self):
+        transaction.DB_CURSOR_EXECUTE.send(
+            mock.Mock(), sql='DELETE FROM res_lang WHERE id = %s'
+        )
+
+        self.assertEqual(Transaction._context_cache, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,6 +4,8 @@ import shutil
 import tempfile
 import unittest
 
+import mock
+
 from destral import utils
 
 
@@ -32,6 +34,113 @@ class FindFilesTests(unittest.TestCase):
         expected = ['foo/bar.py', 'README']
         self.assertEqual(sorted(paths), sorted(expected))
 
+    def test_iter_diff_files_parses_lines_lazily(self):
+        def lines():
+            yield b"--- a/foo/bar.py"
+            yield u"+++ b/foo/bar.py"
+            yield u"@@ -1 +1 @@"
+            yield u"--- /dev/null"
+            yield u"+++ b/foo/new.py"
+            raise AssertionError('Read after the files were consumed')
+
+        files = utils.iter_diff_files(lines())
+
+        self.assertEqual(next(files), u'foo/bar.py')
+        self.assertEqual(next(files), u'foo/new.py')
+
+
+class DetectModulesTests(unittest.TestCase):
+
+    def setUp(self):
+        self.repo_dir = tempfile.mkdtemp()
+        for module_name in ('module_a', 'module_b'):
+            module_dir = os.path.join(self.repo_dir, module_name, 'tests')
+            os.makedirs(module_dir)
+            terp_path = os.path.join(self.repo_dir, module_name, '__terp__.py')
+            with open(terp_path, 'w') as f:
+                f.write("{'name': '%s', 'depends': []}\n" % module_name)
+
+    def tearDown(self):
+        shutil.rmtree(self.repo_dir)
+
+    def path(self, *args):
+        return os.path.join(self.repo_dir, *args)
+
+    def test_detect_module(self):
+        self.assertEqual(
+            utils.detect_module(self.path('module_a', 'tests', 'test_a.py')),
+            'module_a'
+        )
+        self.assertEqual(utils.detect_module(self.path('README')), None)
+
+    def test_detect_modules_groups_the_paths_by_module(self):
+        paths = [
+            self.path('module_b', 'models.py'),
+            self.path('module_a', 'tests', 'test_a.py'),
+            self.path('README'),
+            self.path('module_b', 'tests', 'removed.py'),
+        ]
+
+        modules = utils.detect_modules(paths)
+
+        self.assertEqual(list(modules), ['module_b', 'module_a'])
+        self.assertEqual(modules['module_b'], [paths[0], paths[3]])
+        self.assertEqual(modules['module_a'], [paths[1]])
+
+    def test_directories_are_resolved_once(self):
+        roots = utils.ModuleRoots()
+        utils.detect_modules([self.path('module_a', 'tests', 'a.py')], roots)
+
+        self.assertEqual(roots.known[self.path('module_a', 'tests')], 'module_a')
+        self.assertEqual(roots.known[self.path('module_a')], 'module_a')
+        self.assertNotIn(self.repo_dir, roots.known)
+        self.assertNotIn(self.path('module_a', 'tests', 'a.py'), roots.known)
+
+
+class GetPullRequestFilesTests(unittest.TestCase):
+
+    def test_files_api_follows_the_pages(self):
+        first_page = mock.Mock(
+            links={'next': {'url': 'https://api.github.com/page2'}}
+        )
+        first_page.json.return_value = [
+            {'filename': 'foo/bar.py'},
+            {'filename': 'foo/new.py', 'previous_filename': 'foo/old.py'},
+        ]
+        second_page = mock.Mock(links={})
+        second_page.json.return_value = [{'filename': 'README'}]
+
+        with mock.patch('requests.get') as get:
+            get.side_effect = [first_page, second_page]
+            paths = utils.get_pull_request_files(
+                'gisce/destral', 1, 'token', files_api=True
+            )
+
+        self.assertEqual(
+            paths, ['foo/bar.py', 'foo/new.py', 'foo/old.py', 'README']
+        )
+        self.assertEqual(
+            get.call_args_list[0][0][0],
+            'https://api.github.com/repos/gisce/destral/pulls/1/files'
+        )
+        self.assertEqual(
+            get.call_args_list[1][0][0], 'https://api.github.com/page2'
+        )
+
+    def test_diff_is_streamed(self):
+        response = mock.Mock(encoding=None)
+        response.iter_lines.return_value = iter([
+            u"--- a/foo/bar.py", u"+++ b/foo/bar.py", u"+new line"
+        ])
+
+        with mock.patch('requests.get') as get:
+            get.return_value = response
+            paths = utils.get_pull_request_files('gisce/destral', 1, 'token')
+
+        self.assertEqual(paths, ['foo/bar.py'])
+        self.assertTrue(get.call_args[1]['stream'])
+        self.assertTrue(response.close.called)
+
 
 class CoverageModulesPathTests(unittest.TestCase):
 
@@ -145,5 +254,339 @@ class SortModulesByDependenciesTests(unittest.TestCase):
         self.assertEqual(result, ['base', 'module_a'])
 
 
+class ModuleGraphTests(unittest.TestCase):
+
+    def setUp(self):
+        self.addons_dir = tempfile.mkdtemp()
+        self.write_module('base', [])
+        self.write_module('module_a', ['base'])
+        self.write_module('module_b', ['module_a'])
+        self.write_module('module_c', ['module_b', 'base'])
+        self.graph = utils.ModuleGraph(self.addons_dir)
+
+    def tearDown(self):
+        shutil.rmtree(self.addons_dir)
+
+    def write_module(self, module_name, deps):
+        module_dir = os.path.join(self.addons_dir, module_name)
+        if not os.path.isdir(module_dir):
+            os.makedirs(module_dir)
+        with open(os.path.join(module_dir, '__terp__.py'), 'w') as f:
+            f.write("{{'name': '{}', 'depends': {}}}\n".format(
+                module_name, deps
+            ))
+
+    def test_modules_lists_the_addons_path(self):
+        os.makedirs(os.path.join(self.addons_dir, 'not_a_module'))
+
+        self.assertEqual(
+            self.graph.modules(),
+            set(['base', 'module_a', 'module_b', 'module_c'])
+        )
+
+    def test_dependencies_are_transitive(self):
+        self.assertEqual(
+            self.graph.dependencies('module_c'),
+            set(['module_b', 'module_a', 'base'])
+        )
+        self.assertEqual(self.graph.dependencies('base'), set())
+
+    def test_dependents_are_transitive(self):
+        self.assertEqual(
+            self.graph.dependents('module_a'), set(['module_b', 'module_c'])
+        )
+
+    def test_dependents_with_depth(self):
+        self.assertEqual(
+            self.graph.dependents('module_a', depth=1), set(['module_b'])
+        )
+        self.assertEqual(
+            self.graph.dependents('base', depth=1),
+            set(['module_a', 'module_c'])
+        )
+
+    def test_dependents_follow_the_modified_manifests(self):
+        self.assertEqual(self.graph.dependents('module_b'), set(['module_c']))
+        self.write_module('module_c', ['module_a'])
+        terp_path = os.path.join(self.addons_dir, 'module_c', '__terp__.py')
+        mtime = os.stat(terp_path).st_mtime + 10
+        os.utime(terp_path, (mtime, mtime))
+
+        self.assertEqual(self.graph.dependents('module_b'), set())
+        self.assertEqual(
+            self.graph.dependents('module_a'), set(['module_b', 'module_c'])
+        )
+
+    def test_index_is_only_persisted_on_demand(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        with mock.patch.dict(os.environ, {'DESTRAL_CACHE_DIR': cache_dir}):
+            with mock.patch.dict(utils.ManifestIndex._indexes, clear=True):
+                self.assertIsNone(
+                    utils.ManifestIndex.get(self.addons_dir).path
+                )
+            with mock.patch.dict(utils.ManifestIndex._indexes, clear=True):
+                os.environ['DESTRAL_MANIFEST_CACHE'] = 'True'
+                path = utils.ManifestIndex.get(self.addons_dir).path
+        self.assertEqual(os.path.dirname(path), cache_dir)
+
+    def test_manifest_is_parsed_again_when_modified(self):
+        self.assertEqual(self.graph.depends('module_b'), ['module_a'])
+        self.write_module('module_b', ['base'])
+        terp_path = os.path.join(self.addons_dir, 'module_b', '__terp__.py')
+        mtime = os.stat(terp_path).st_mtime + 10
+        os.utime(terp_path, (mtime, mtime))
+
+        self.assertEqual(self.graph.depends('module_b'), ['base'])
+
+    def test_missing_module_raises(self):
+        self.assertRaises(Exception, self.graph.dependencies, 'missing')
+
+    def test_get_impacted_modules(self):
+        self.assertEqual(
+            utils.get_impacted_modules(['module_a'], self.addons_dir),
+            ['module_a', 'module_b', 'module_c']
+        )
+        self.assertEqual(
+            utils.get_impacted_modules(['module_a'], self.addons_dir, depth=1),
+            ['module_a', 'module_b']
+        )
+
+    def test_get_dependencies_uses_the_graph(self):
+        deps = utils.get_dependencies('module_b', self.addons_dir)
+
+        self.assertEqual(sorted(deps), ['base', 'module_a'])
+
+
+class InstallRequirementsTests(unittest.TestCase):
+
+    def setUp(self):
+        self.addons_dir = tempfile.mkdtemp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.prefix = tempfile.mkdtemp()
+        os.environ['DESTRAL_CACHE_DIR'] = self.cache_dir
+        os.makedirs(os.path.join(self.prefix, 'bin'))
+        open(os.path.join(self.prefix, 'bin', 'pip'), 'w').close()
+        self.write_module('base', [], {'requirements.txt': 'six\n'})
+        self.write_module('module_a', ['base'], {
+            'requirements.txt': '# Comment\nsix\nclick>=6\n',
+            'requirements-dev.txt': '-r extra.txt\nmock\n',
+        })
+        self.write_module('module_b', ['base'], {
+            'requirements.txt': 'click>=6\nosconf\n'
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.addons_dir)
+        shutil.rmtree(self.cache_dir)
+        shutil.rmtree(self.prefix)
+        del os.environ['DESTRAL_CACHE_DIR']
+
+    def write_module(self, module_name, deps, requirements):
+        module_dir = os.path.join(self.addons_dir, module_name)
+        os.makedirs(module_dir)
+        with open(os.path.join(module_dir, '__terp__.py'), 'w') as f:
+            f.write("{{'name': '{}', 'depends': {}}}\n".format(
+                module_name, deps
+            ))
+        for filename, content in requirements.items():
+            with open(os.path.join(module_dir, filename), 'w') as f:
+                f.write(content)
+
+    def test_plan_merges_and_dedupes(self):
+        plan = utils.plan_requirements(
+            ['module_a', 'module_b'], self.addons_dir
+        )
+
+        extra = os.path.join(self.addons_dir, 'module_a', 'extra.txt')
+        self.assertEqual(
+            plan, ['six', 'click>=6', '-r {}'.format(extra), 'mock', 'osconf']
+        )
+
+    def test_plan_combines_the_specifiers_of_a_project(self):
+        with open(os.path.join(
+                self.addons_dir, 'module_b', 'requirements.txt'), 'w') as f:
+            f.write('Click>=6,<8\nsix==1.16.0\nosconf\n')
+
+        plan = utils.plan_requirements(
+            ['module_a', 'module_b'], self.addons_dir
+        )
+
+        # A single line per project, pip refuses double requirements
+        self.assertEqual(plan[:2], ['six==1.16.0', 'click>=6,<8'])
+
+    def test_merge_requirements(self):
+        self.assertEqual(utils.merge_requirements([
+            'foo==1.0', 'bar', '-r /tmp/extra.txt', 'Foo>=1',
+            'bar[socks]', '-r /tmp/extra.txt',
+            'baz; python_version < "3"', 'baz>=2',
+        ]), [
+            'foo==1.0,>=1', 'bar[socks]', '-r /tmp/extra.txt', 'baz>=2'
+        ])
+
+    def test_single_install_skipped_when_stamp_matches(self):
+        with mock.patch.object(utils.sys, 'prefix', self.prefix), \
+                mock.patch.object(utils.subprocess, 'check_call') as call:
+            self.assertTrue(utils.install_modules_requirements(
+                ['module_a', 'module_b'], self.addons_dir
+            ))
+            self.assertEqual(call.call_count, 1)
+            self.assertFalse(utils.install_modules_requirements(
+                ['module_a', 'module_b'], self.addons_dir
+            ))
+            self.assertEqual(call.call_count, 1)
+            self.assertTrue(utils.install_modules_requirements(
+                ['module_b'], self.addons_dir
+            ))
+            self.assertEqual(call.call_count, 2)
+
+    def test_install_when_an_included_file_changes(self):
+        module_dir = os.path.join(self.addons_dir, 'module_a')
+        with open(os.path.join(module_dir, 'extra.txt'), 'w') as f:
+            f.write('-r nested.txt\n')
+        nested_path = os.path.join(module_dir, 'nested.txt')
+        with open(nested_path, 'w') as f:
+            f.write('requests\n')
+        with mock.patch.object(utils.sys, 'prefix', self.prefix), \
+                mock.patch.object(utils.subprocess, 'check_call') as call:
+            utils.install_modules_requirements(['module_a'], self.addons_dir)
+            utils.install_modules_requirements(['module_a'], self.addons_dir)
+            self.assertEqual(call.call_count, 1)
+            with open(nested_path, 'w') as f:
+                f.write('requests>=2\n')
+            self.assertTrue(utils.install_modules_requirements(
+                ['module_a'], self.addons_dir
+            ))
+            self.assertEqual(call.call_count, 2)
+
+
+class ManifestIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        self.addons_dir = tempfile.mkdtemp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.index_path = os.path.join(self.cache_dir, 'index.json')
+        self.module_dir = os.path.join(self.addons_dir, 'module_a')
+        os.makedirs(os.path.join(self.module_dir, 'tests'))
+        with open(os.path.join(self.module_dir, '__terp__.py'), 'w') as f:
+            f.write("{'name': 'module_a', 'depends': ['base']}\n")
+        with open(os.path.join(self.module_dir, 'requirements.txt'), 'w') as f:
+            f.write('six\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.addons_dir)
+        shutil.rmtree(self.cache_dir)
+
+    def test_entry_describes_the_module(self):
+        index = utils.ManifestIndex(self.addons_dir)
+
+        entry = index.entry('module_a')
+        self.assertEqual(entry['depends'], ['base'])
+        self.assertEqual(entry['manifest']['name'], 'module_a')
+        self.assertTrue(entry['tests'])
+        self.assertFalse(entry['spec'])
+        self.assertFalse(entry['specs'])
+        self.assertEqual(entry['requirements'], ['requirements.txt'])
+        self.assertEqual(index.entry('missing'), None)
+
+    def test_index_is_persisted(self):
+        index = utils.ManifestIndex(self.addons_dir, self.index_path)
+        index.modules()
+        index.entry('module_a')
+        index.save()
+
+        index = utils.ManifestIndex(self.addons_dir, self.index_path)
+        self.assertFalse(index.dirty)
+        self.assertEqual(index.modules(), ['module_a'])
+        self.assertEqual(index.entry('module_a')['depends'], ['base'])
+        self.assertFalse(index.dirty)
+
+    def test_entry_is_refreshed_when_the_module_changes(self):
+        index = utils.ManifestIndex(self.addons_dir)
+        index.entry('module_a')
+        os.makedirs(os.path.join(self.module_dir, 'spec'))
+        mtime = os.stat(self.module_dir).st_mtime + 10
+        os.utime(self.module_dir, (mtime, mtime))
+
+        self.assertTrue(index.entry('module_a')['spec'])
+
+
+class ScanPoTests(unittest.TestCase):
+
+    PO = [
+        u'# Translation',
+        u'msgid ""',
+        u'msgstr ""',
+        u'"Language: ca_ES\\n"',
+        u'',
+        u'#. module: test',
+        u'msgid "Simple"',
+        u'msgstr "Simple"',
+        u'',
+        u'msgid ""',
+        u'"Multi "',
+        u'"line"',
+        u'msgstr ""',
+        u'',
+        u'msgctxt "context"',
+        u'msgid "One apple"',
+        u'msgid_plural "%d apples"',
+        u'msgstr[0] ""',
+        u'msgstr[1] "%d pomes"',
+        u'#~ msgid "Obsolete"',
+        u'#~ msgstr "Obsolet"',
+        u'msgid "Say \\"hi\\""',
+        u'msgstr ""',
+    ]
+
+    def test_scan_messages(self):
+        messages = utils.scan_po(self.PO)
+
+        self.assertEqual(list(messages.items()), [
+            (u'', True),
+            (u'Simple', True),
+            (u'Multi line', False),
+            (u'One apple', True),
+            (u'Say "hi"', False),
+        ])
+
+    def test_compare_messages(self):
+        pot = utils.scan_po([
+            u'msgid "Simple"', u'msgstr ""',
+            u'msgid "Multi line"', u'msgstr ""',
+            u'msgid "Missing"', u'msgstr ""',
+        ])
+        po = utils.scan_po(self.PO)
+
+        self.assertEqual(
+            utils.compare_pofiles(pot, po), ([u'Missing'], [u'Multi line'])
+        )
+
+    def test_compare_in_memory_buffer(self):
+        from six.moves import StringIO
+        pot = StringIO()
+        pot.write(u'msgid "Simple"\nmsgstr ""\n\nmsgid "Missing"\nmsgstr ""\n')
+        po = utils.scan_po(self.PO)
+
+        self.assertEqual(utils.compare_pofiles(pot, po), ([u'Missing'], []))
+
+    def test_load_po_is_cached_by_mtime(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        po_path = os.path.join(temp_dir, 'ca_ES.po')
+        with open(po_path, 'w') as po:
+            po.write('msgid "Simple"\nmsgstr ""\n')
+
+        messages = utils.load_po(po_path)
+        self.assertIs(utils.load_po(po_path), messages)
+        self.assertEqual(dict(messages), {u'Simple': False})
+
+        with open(po_path, 'w') as po:
+            po.write('msgid "Simple"\nmsgstr "Simple"\n')
+        mtime = os.stat(po_path).st_mtime + 10
+        os.utime(po_path, (mtime, mtime))
+        self.assertEqual(dict(utils.load_po(po_path)), {u'Simple': True})
+
+
 if __name__ == '__main__':
     unittest.main()